@@ -1,10 +1,23 @@
+import json
+import os
+import tempfile
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-import joblib
-import pandas as pd
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from src.api.startup import record_imports, report, timed
+
+with record_imports():
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+    from pydantic import BaseModel
+
+    from src.api import metrics
+    from src.api.batching import MicroBatcher
+    from src.api.cache import PredictionCache
+    from src.api.profiler import SamplingProfiler
+    from src.api.registry import ModelRegistry
 
 import warnings
 warnings.filterwarnings(
@@ -14,6 +27,35 @@ warnings.filterwarnings(
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 MODEL_PATH = PROJECT_ROOT / "models" / "global_best_model_optuna.pkl"
+SCHEMA_PATH = PROJECT_ROOT / "data" / "accident_schema.json"
+
+# "pandas" runs the fitted pipeline on a DataFrame; "compiled" encodes request
+# dicts with a NumPy encoder built from the fitted preprocessing
+INFERENCE_MODE = os.getenv("API_INFERENCE_MODE", "pandas")
+ENCODER_DTYPE = os.getenv("API_ENCODER_DTYPE", "float32")
+
+# Set by src/api/serve.py when workers are forked from a preloaded master.
+# Hot reload is then off: a worker loading its own copy of the model would
+# un-share the pages it inherited from the master. Roll out a new model by
+# restarting the master (gunicorn's USR2 + QUIT upgrade keeps serving).
+PREFORKED = os.getenv("API_PREFORKED", "0") == "1"
+
+# Seconds between checks of the model file for a new version (0 disables)
+MODEL_POLL_S = 0.0 if PREFORKED else float(os.getenv("API_MODEL_POLL_S", "10"))
+
+# Opt-in server-side micro-batching of concurrent /predict calls
+BATCHING_ENABLED = os.getenv("API_BATCHING", "0") == "1"
+BATCH_MAX_SIZE = int(os.getenv("API_BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_US = int(os.getenv("API_BATCH_MAX_WAIT_US", "2000"))
+
+# Per-row prediction cache (API_CACHE_SIZE=0 disables it)
+CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "10000"))
+CACHE_TTL_S = float(os.getenv("API_CACHE_TTL_S", "300"))
+
+# Records scored per chunk by /predict/stream
+STREAM_CHUNK_SIZE = int(os.getenv("API_STREAM_CHUNK_SIZE", "512"))
+# Bytes of a streamed upload kept in memory before it spills to a temp file
+STREAM_SPOOL_BYTES = int(os.getenv("API_STREAM_SPOOL_BYTES", str(8 << 20)))
 
 app = FastAPI(
     title="Accident Severity Prediction API",
@@ -21,28 +63,60 @@ app = FastAPI(
     version="1.0.0",
 )
 
-def load_model(path: Path):
-    """Load the trained model from disk."""
-    if not path.exists():
-        raise FileNotFoundError(f"Model file not found: {path}")
-
-    print(f"Loading model from: {path}")
-    m = joblib.load(path)
-    print("✓ Model loaded successfully!")
-    print(f"  Model type: {type(m).__name__}")
-    if hasattr(m, "named_steps"):
-        print(f"  Pipeline steps: {list(m.named_steps.keys())}")
-    return m
-
+registry = ModelRegistry(
+    MODEL_PATH,
+    inference_mode=INFERENCE_MODE,
+    encoder_dtype=ENCODER_DTYPE,
+    poll_interval=MODEL_POLL_S,
+    schema_path=SCHEMA_PATH,
+)
 
 try:
-    model = load_model(MODEL_PATH)
+    with record_imports(), timed("model load"):
+        registry.load()
 except Exception as e:
     print(f"✗ ERROR: Failed to load model from {MODEL_PATH}")
     print(f"  Error: {e}")
     raise RuntimeError(f"Failed to load model: {e}")
 
 
+def score(records):
+    """Score a list of feature dicts with whichever model is active right now."""
+    return registry.current.score(records)
+
+
+cache = None
+if CACHE_SIZE > 0:
+    feature_names = getattr(registry.current.model, "feature_names_in_", None)
+    if feature_names is not None:
+        cache = PredictionCache(
+            feature_names,
+            maxsize=CACHE_SIZE,
+            ttl=CACHE_TTL_S,
+        )
+        registry.on_swap.append(
+            lambda loaded: cache.reset(getattr(loaded.model, "feature_names_in_", None))
+        )
+    else:
+        print("✗ Prediction cache disabled: model has no feature_names_in_")
+
+
+profiler = SamplingProfiler()
+
+
+# Set once this process has finished its startup hook. With pre-forked
+# workers (src/api/serve.py) every worker flips its own flag.
+ready = False
+
+batcher = None
+if BATCHING_ENABLED:
+    batcher = MicroBatcher(
+        score,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_us=BATCH_MAX_WAIT_US,
+    )
+
+
 class PredictRequest(BaseModel):
     """
     Prediction request with list of instances (dicts of features).
@@ -84,17 +158,34 @@ class PredictRequest(BaseModel):
 
 class PredictResponse(BaseModel):
     predictions: List[float]
+    probabilities: Optional[List[List[float]]] = None
     count: int
 
     class Config:
         schema_extra = {
             "example": {
-                "predictions": [452600.0],
+                "predictions": [2.0],
+                "probabilities": [[0.01, 0.86, 0.10, 0.03]],
                 "count": 1,
             }
         }
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    request.state.received_at = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - request.state.received_at, path)
+        metrics.REQUESTS.inc(path, str(status))
+
+
 @app.get("/")
 def root():
     return {
@@ -103,6 +194,10 @@ def root():
         "endpoints": {
             "health": "/health",
             "predict": "/predict",
+            "predict_stream": "/predict/stream",
+            "reload": "/admin/reload",
+            "metrics": "/metrics",
+            "profiler": "/admin/profiler",
             "docs": "/docs",
         },
     }
@@ -110,50 +205,270 @@ def root():
 
 @app.get("/health")
 def health():
-    return {
-        "status": "healthy",
-        "model_loaded": str(model is not None),
+    status = {
+        "status": "healthy" if ready else "starting",
+        "ready": ready,
+        "worker_pid": os.getpid(),
+        "model_loaded": str(registry.current is not None),
         "model_path": str(MODEL_PATH),
+        **registry.stats(),
+        "startup_s": report(),
     }
+    if batcher is not None:
+        status["batching"] = batcher.stats()
+    if cache is not None:
+        status["cache"] = cache.stats()
+    if not ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+def run_model(records):
+    """
+    Score request records through the configured path and return
+    (predictions, probabilities) as Python lists, one entry per record.
+    """
+    try:
+        if batcher is not None:
+            labels, probs = batcher.submit(records)
+        else:
+            labels, probs = score(records)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {e}",
+        )
+
+    preds = (labels + 1).tolist()
+    probs = probs.tolist() if probs is not None else [None] * len(preds)
+    return preds, probs
 
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(request: PredictRequest):
+def predict(request: PredictRequest, http_request: Request):
+    # Body read, JSON parsing and Pydantic validation happen before we get here
+    metrics.STAGE_SECONDS.observe(
+        time.perf_counter() - http_request.state.received_at, "validation"
+    )
     if not request.instances:
         raise HTTPException(
             status_code=400,
             detail="No instances provided.",
         )
+    metrics.REQUEST_ROWS.observe(len(request.instances))
+
+    if cache is None:
+        preds, probs = run_model(request.instances)
+        metrics.ROWS.inc("model", amount=len(preds))
+    else:
+        with metrics.stage("cache"):
+            generation = cache.generation
+            keys = [cache.key(r) for r in request.instances]
+            cached = cache.get_many(keys)
+            missing = [i for i, hit in enumerate(cached) if hit is None]
+
+        if missing:
+            miss_preds, miss_probs = run_model([request.instances[i] for i in missing])
+            fresh = list(zip(miss_preds, miss_probs))
+            cache.put_many(
+                ((keys[i], value) for i, value in zip(missing, fresh)),
+                generation=generation,
+            )
+            for i, value in zip(missing, fresh):
+                cached[i] = value
+
+        preds = [p for p, _ in cached]
+        probs = [pr for _, pr in cached]
+        metrics.ROWS.inc("model", amount=len(missing))
+        metrics.ROWS.inc("cache", amount=len(preds) - len(missing))
+
+    # Serialized here rather than by FastAPI so the cost shows up as a stage
+    with metrics.stage("serialize"):
+        body = json.dumps({
+            "predictions": preds,
+            "probabilities": probs if probs[0] is not None else None,
+            "count": len(preds),
+        })
+    return Response(content=body, media_type="application/json")
 
+
+def _prediction_lines(start, labels, probs):
+    preds = (labels + 1).tolist()
+    probs = probs.tolist() if probs is not None else [None] * len(preds)
+    return "".join(
+        json.dumps({"index": start + i, "prediction": p, "probabilities": pr}) + "\n"
+        for i, (p, pr) in enumerate(zip(preds, probs))
+    )
+
+
+def score_chunk(start, records):
+    """Score one chunk of streamed records and render it as NDJSON lines."""
     try:
-        X = pd.DataFrame(request.instances)
-    except Exception as e:
+        return _prediction_lines(start, *score(records))
+    except Exception:
+        pass
+
+    # One malformed record must not fail the rest of the chunk
+    out = []
+    for i, record in enumerate(records):
+        try:
+            out.append(_prediction_lines(start + i, *score([record])))
+        except Exception as e:
+            out.append(json.dumps({"index": start + i, "error": f"Prediction failed: {e}"}) + "\n")
+    return "".join(out)
+
+
+async def spool_body(request):
+    """
+    Read the whole request body into a temporary file (in memory up to
+    STREAM_SPOOL_BYTES, on disk beyond) and return it rewound.
+
+    The body has to be consumed before the StreamingResponse starts: while
+    it runs, Starlette listens for disconnects on the same receive channel
+    and would swallow body messages.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_BYTES)
+    async for data in request.stream():
+        spool.write(data)
+    spool.seek(0)
+    return spool
+
+
+async def stream_predictions(spool):
+    """
+    Read NDJSON records off a spooled request body and yield scored NDJSON
+    lines.
+
+    Only the current chunk is held in memory, so the upload can be
+    arbitrarily large, and the first results go out as soon as the first
+    chunk is scored. Each output line carries the 0-based index of its
+    input line; lines that aren't a JSON object get an error line instead
+    of failing the stream.
+    """
+    chunk, chunk_start, index = [], 0, 0
+
+    try:
+        for line in spool:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                # Flush what came before so output stays in input order
+                if chunk:
+                    yield await run_in_threadpool(score_chunk, chunk_start, chunk)
+                    chunk = []
+                yield json.dumps({"index": index, "error": f"Invalid record: {e}"}) + "\n"
+                index += 1
+                chunk_start = index
+                continue
+
+            chunk.append(record)
+            index += 1
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield await run_in_threadpool(score_chunk, chunk_start, chunk)
+                chunk, chunk_start = [], index
+
+        if chunk:
+            yield await run_in_threadpool(score_chunk, chunk_start, chunk)
+    finally:
+        spool.close()
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """Bulk scoring: NDJSON records in, one NDJSON prediction line per record out."""
+    spool = await spool_body(request)
+    return StreamingResponse(
+        stream_predictions(spool),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of request, stage, batcher and cache metrics."""
+    extra = metrics.render_gauges(
+        "api_model_reloads", {"total": registry.reloads}, "Successful hot model reloads"
+    )
+    if batcher is not None:
+        extra += metrics.render_gauges("api_batcher", batcher.stats(), "Micro-batcher statistic")
+    if cache is not None:
+        extra += metrics.render_gauges("api_cache", cache.stats(), "Prediction cache statistic")
+    return PlainTextResponse(
+        metrics.render(extra), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/admin/profiler")
+def profiler_status():
+    return profiler.stats()
+
+
+@app.post("/admin/profiler/start")
+def profiler_start(interval_ms: float = 5.0):
+    """Start sampling every thread's stack every `interval_ms` milliseconds."""
+    started = profiler.start(interval=interval_ms / 1000)
+    return {"started": started, **profiler.stats()}
+
+
+@app.post("/admin/profiler/stop")
+def profiler_stop(limit: Optional[int] = None):
+    """Stop sampling and return the stacks in collapsed (flamegraph) format."""
+    profiler.stop()
+    return PlainTextResponse(profiler.collapsed(limit))
+
+
+@app.post("/admin/reload")
+def reload_model():
+    """Reload the model file now, even if it looks unchanged."""
+    if PREFORKED:
         raise HTTPException(
-            status_code=400,
-            detail=f"Invalid input format: {e}",
+            status_code=409,
+            detail="Hot reload is disabled with pre-forked workers; restart the server "
+                   "(gunicorn USR2 then QUIT the old master) to load a new model",
         )
     try:
-        preds = model.predict(X) + 1
-        probs = model.predict_proba(X)
+        swapped = registry.reload(force=True)
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Prediction failed: {e}",
+            detail=f"Reload failed, still serving {registry.current.version}: {e}",
         )
-
-    return {
-        "predictions": preds.tolist(),
-        "probabilities": probs.tolist(),
-        "count": len(preds),
-    }
+    return {"swapped": swapped, **registry.stats()}
 
 
 @app.on_event("startup")
 async def startup_event():
+    global ready
     print("\n" + "=" * 80)
     print("Housing Price Prediction API - Starting Up")
     print("=" * 80)
     print(f"Model path: {MODEL_PATH}")
-    print(f"Model loaded: {model is not None}")
-    print("API is ready to accept requests!")
-    print("=" * 80 + "\n")
\ No newline at end of file
+    print(f"Model version: {registry.current.version}")
+    with timed("warm-up"):
+        registry.warm_up()
+    registry.start()
+    if batcher is not None:
+        batcher.start()
+        print(
+            f"Micro-batching: max {BATCH_MAX_SIZE} rows, "
+            f"max wait {BATCH_MAX_WAIT_US}us"
+        )
+    ready = True
+    print("Startup timings (s):")
+    for name, seconds in report().items():
+        print(f"  {name:<30} {seconds:.3f}")
+    print(f"API is ready to accept requests! (pid {os.getpid()})")
+    print("=" * 80 + "\n")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    registry.stop()
+    if batcher is not None:
+        batcher.stop()
@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import pandas as pd
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+class _Pending:
+    __slots__ = ("frame", "future", "enqueued")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+def _concat(parts):
+    if isinstance(parts[0], pd.DataFrame):
+        return pd.concat(parts, ignore_index=True)
+    return [record for part in parts for record in part]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests and scores them as one frame.
+
+    Requests are DataFrames or lists of records, whichever `score_fn` accepts.
+
+    Callers block in `submit` while a single worker thread drains the queue.
+    A batch is dispatched when it reaches `max_batch_size` rows, when the
+    oldest request has waited `max_wait_us` microseconds, or as soon as every
+    in-flight request is already part of the batch, so a lone request is
+    never held back waiting for company.
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_us=2000):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+
+        self._queue = queue.Queue()
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._max_rows = 0
+        self._delay_sum = 0.0
+        self._delay_max = 0.0
+        self._size_buckets = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread and fail every request still queued, so no
+        caller stays blocked in `submit` once the batcher is gone.
+        """
+        with self._lock:
+            self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            item.future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    def submit(self, frame):
+        """Queue a frame for scoring and block until its (labels, probs) are ready."""
+        item = _Pending(frame)
+        with self._lock:
+            # Checked under the lock so nothing is queued after stop() drains
+            if not self._running:
+                raise RuntimeError("Micro-batcher is not running")
+            self._inflight += 1
+            self._queue.put(item)
+        try:
+            return item.future.result()
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        rows = len(first.frame)
+        deadline = first.enqueued + self.max_wait
+
+        while rows < self.max_batch_size:
+            with self._lock:
+                if len(batch) >= self._inflight:
+                    break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item.frame)
+
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if batch:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        lengths = [len(item.frame) for item in batch]
+
+        try:
+            if len(batch) == 1:
+                X = batch[0].frame
+            else:
+                X = _concat([item.frame for item in batch])
+            labels, probs = self.score_fn(X)
+        except Exception:
+            # One malformed request must not fail the rest of the batch.
+            for item in batch:
+                try:
+                    item.future.set_result(self.score_fn(item.frame))
+                except Exception as e:
+                    item.future.set_exception(e)
+        else:
+            offset = 0
+            for item, n in zip(batch, lengths):
+                item.future.set_result((
+                    labels[offset:offset + n],
+                    probs[offset:offset + n] if probs is not None else None,
+                ))
+                offset += n
+
+        self._record(batch, sum(lengths), started)
+
+    def _record(self, batch, rows, started):
+        self._batches += 1
+        self._requests += len(batch)
+        self._rows += rows
+        self._max_rows = max(self._max_rows, rows)
+
+        for item in batch:
+            delay = started - item.enqueued
+            self._delay_sum += delay
+            self._delay_max = max(self._delay_max, delay)
+
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if rows <= bound:
+                self._size_buckets[i] += 1
+                break
+        else:
+            self._size_buckets[-1] += 1
+
+    def stats(self):
+        batches = self._batches or 1
+        requests = self._requests or 1
+        labels = [str(b) for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": int(self.max_wait * 1e6),
+            "batches": self._batches,
+            "requests": self._requests,
+            "rows": self._rows,
+            "mean_batch_rows": self._rows / batches,
+            "max_batch_rows": self._max_rows,
+            "batch_rows_histogram": dict(zip(labels, self._size_buckets)),
+            "mean_queue_delay_us": self._delay_sum / requests * 1e6,
+            "max_queue_delay_us": self._delay_max * 1e6,
+            "queue_depth": self._queue.qsize(),
+        }
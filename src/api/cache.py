@@ -0,0 +1,100 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from numbers import Real
+
+
+class PredictionCache:
+    """
+    In-process LRU cache with a TTL for per-row prediction results.
+
+    Rows are keyed on their canonical feature tuple: values in the model's
+    column order, numbers as float (so 1, 1.0 and True collide, as they do
+    once the pipeline casts them), missing/None/NaN as None, and keys the
+    model doesn't use dropped. `reset` must be called whenever a different
+    model becomes active; results computed before a reset are discarded by
+    passing the `generation` read before scoring to `put_many`.
+    """
+
+    def __init__(self, columns, maxsize=10_000, ttl=300.0):
+        self.columns = list(columns)
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _canonical(value):
+        if value is None:
+            return None
+        if isinstance(value, Real):
+            value = float(value)
+            return None if math.isnan(value) else value
+        return str(value)
+
+    def key(self, record):
+        return tuple(self._canonical(record.get(c)) for c in self.columns)
+
+    def get_many(self, keys):
+        """Cached values for `keys`, with None for every miss."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is not None and entry[0] < now:
+                    del self._data[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    values.append(entry[1])
+        return values
+
+    def put_many(self, items, generation=None):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            for key, value in items:
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def reset(self, columns=None):
+        """Drop every entry, optionally switching to a new model's columns."""
+        with self._lock:
+            if columns is not None:
+                self.columns = list(columns)
+            self._data.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
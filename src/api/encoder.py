@@ -0,0 +1,303 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from src.utils.pipelines import ClusterSimilarity
+
+
+def _is_nan(value):
+    # SimpleImputer only masks NaN in object columns; None is left for the
+    # OneHotEncoder, which treats it as an unknown category.
+    return isinstance(value, float) and value != value
+
+
+def _branch_steps(transformer):
+    if isinstance(transformer, Pipeline):
+        return [step for _, step in transformer.steps]
+    return [transformer]
+
+
+class _GeoBranch:
+    """ClusterSimilarity: RBF similarity to the fitted KMeans centers."""
+
+    def __init__(self, columns, cs):
+        self.columns = columns
+        self.centers = np.asarray(cs.kmeans_.cluster_centers_, dtype=np.float64)
+        self.gamma = float(cs.gamma)
+        self.width = self.centers.shape[0]
+
+    def write(self, records, out):
+        X = np.array(
+            [[r.get(c) for c in self.columns] for r in records], dtype=np.float64
+        )
+        if np.isnan(X).any():
+            raise ValueError(f"Input contains NaN in {self.columns}")
+        diff = X[:, None, :] - self.centers[None, :, :]
+        np.exp(-self.gamma * np.einsum("ijk,ijk->ij", diff, diff), out=out)
+
+
+class _NumericBranch:
+    """SimpleImputer (mean/median/constant) followed by an optional StandardScaler."""
+
+    def __init__(self, columns, steps):
+        imputer, scaler = None, None
+        for step in steps:
+            if isinstance(step, SimpleImputer) and imputer is None and scaler is None:
+                imputer = step
+            elif isinstance(step, StandardScaler) and scaler is None:
+                scaler = step
+            else:
+                raise ValueError(f"Unsupported numeric step: {type(step).__name__}")
+        if imputer is not None and imputer.add_indicator:
+            raise ValueError("SimpleImputer(add_indicator=True) is not supported")
+
+        columns = list(columns)
+        fill = np.full(len(columns), np.nan)
+        if imputer is not None:
+            fill = np.asarray(imputer.statistics_, dtype=np.float64)
+            if not imputer.keep_empty_features:
+                # Columns that were all-missing at fit time are dropped by the imputer
+                keep = ~np.isnan(fill)
+                columns = [c for c, k in zip(columns, keep) if k]
+                fill = fill[keep]
+
+        self.columns = columns
+        self.fill = fill
+        self.mean = None
+        self.scale = None
+        if scaler is not None:
+            if scaler.with_mean:
+                self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if scaler.with_std:
+                self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.width = len(columns)
+
+    def write(self, records, out):
+        X = np.array(
+            [[r.get(c) for c in self.columns] for r in records], dtype=np.float64
+        )
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self.fill, X.shape)[missing]
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        out[...] = X
+
+
+class _CategoricalBranch:
+    """SimpleImputer(most_frequent/constant) followed by a OneHotEncoder."""
+
+    def __init__(self, columns, steps):
+        imputer, ohe = None, None
+        for step in steps:
+            if isinstance(step, SimpleImputer) and imputer is None and ohe is None:
+                imputer = step
+            elif isinstance(step, OneHotEncoder) and ohe is None:
+                ohe = step
+            else:
+                raise ValueError(f"Unsupported categorical step: {type(step).__name__}")
+        if ohe is None:
+            raise ValueError("Categorical branch has no OneHotEncoder")
+        if ohe.drop_idx_ is not None or getattr(ohe, "_infrequent_enabled", False):
+            raise ValueError("OneHotEncoder with drop/infrequent categories is not supported")
+        if imputer is not None and (imputer.add_indicator or len(imputer.statistics_) != len(columns)):
+            raise ValueError("Unsupported SimpleImputer configuration")
+
+        self.columns = list(columns)
+        self.fill = list(imputer.statistics_) if imputer is not None else [None] * len(columns)
+        self.handle_unknown = ohe.handle_unknown
+        self.lookups = []
+        offset = 0
+        for categories in ohe.categories_:
+            self.lookups.append({v: offset + i for i, v in enumerate(categories)})
+            offset += len(categories)
+        self.width = offset
+
+    def write(self, records, out):
+        out[...] = 0.0
+        for i, r in enumerate(records):
+            for c, fill, lookup in zip(self.columns, self.fill, self.lookups):
+                value = r.get(c)
+                if _is_nan(value):
+                    value = fill
+                pos = lookup.get(value)
+                if pos is not None:
+                    out[i, pos] = 1.0
+                elif self.handle_unknown == "error":
+                    raise ValueError(f"Found unknown category {value!r} in column {c!r}")
+
+
+class CompiledEncoder:
+    """
+    Pure-NumPy replacement for a fitted `build_preprocessing` ColumnTransformer.
+
+    Reads the fitted parameters once (KMeans centers, imputer statistics,
+    one-hot categories, scaler mean/scale) and writes request dicts straight
+    into a per-thread preallocated matrix, skipping DataFrame construction and
+    the ColumnTransformer column dispatch. The returned matrix is a view into
+    that buffer and is only valid until the next `transform` on the same thread.
+    """
+
+    def __init__(self, preprocessing, dtype=np.float32):
+        if not isinstance(preprocessing, ColumnTransformer):
+            raise ValueError(f"Expected a ColumnTransformer, got {type(preprocessing).__name__}")
+        if not hasattr(preprocessing, "feature_names_in_"):
+            raise ValueError("ColumnTransformer was not fitted on a DataFrame")
+
+        names = list(preprocessing.feature_names_in_)
+        self.branches = []
+        for name, transformer, columns in preprocessing.transformers_:
+            if isinstance(transformer, str):
+                if transformer == "drop":
+                    continue
+                raise ValueError(f"Unsupported transformer {transformer!r} in branch {name!r}")
+            columns = [names[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+            if len(columns) == 0:
+                continue
+            self.branches.append((name, self._compile_branch(transformer, columns)))
+
+        self.feature_names_in = names
+        self.dtype = np.dtype(dtype)
+        self.n_features_out = sum(branch.width for _, branch in self.branches)
+        self._local = threading.local()
+
+    @staticmethod
+    def _compile_branch(transformer, columns):
+        if isinstance(transformer, ClusterSimilarity):
+            return _GeoBranch(columns, transformer)
+        steps = _branch_steps(transformer)
+        if any(isinstance(step, OneHotEncoder) for step in steps):
+            return _CategoricalBranch(columns, steps)
+        return _NumericBranch(columns, steps)
+
+    def _buffer(self, n_rows):
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n_rows:
+            size = max(n_rows, 2 * buf.shape[0] if buf is not None else 1)
+            buf = np.empty((size, self.n_features_out), dtype=self.dtype)
+            self._local.buf = buf
+        return buf[:n_rows]
+
+    def transform(self, records, timer=None):
+        """
+        Encode `records`; `timer(name)`, if given, must return a context
+        manager and is entered around each branch (geo, cat, remainder).
+
+        Like the pandas path, a feature may be missing from some records
+        (it is imputed there) but raises ValueError when no record has it.
+        """
+        present = set().union(*records)
+        missing = [c for c in self.feature_names_in if c not in present]
+        if missing:
+            raise ValueError(f"columns are missing: {missing}")
+
+        out = self._buffer(len(records))
+        start = 0
+        for name, branch in self.branches:
+            view = out[:, start:start + branch.width]
+            if timer is None:
+                branch.write(records, view)
+            else:
+                with timer(name):
+                    branch.write(records, view)
+            start += branch.width
+        return out
+
+
+def compile_pipeline(model, dtype=np.float32):
+    """
+    Split a fitted pipeline into (CompiledEncoder, remaining steps).
+
+    The remaining steps (optional PCA and the estimator) are returned as a
+    Pipeline slice that accepts the encoded matrix.
+    """
+    if not isinstance(model, Pipeline):
+        raise ValueError(f"Expected a Pipeline, got {type(model).__name__}")
+    return CompiledEncoder(model.steps[0][1], dtype=dtype), model[1:]
+
+
+def parity_records(encoder, n=64, seed=0):
+    """
+    Synthetic records that exercise every branch of the encoder: values
+    spread around the fitted centers/means, known, unknown, NaN and None
+    categories, and missing values in every imputed numeric column.
+    """
+    rng = np.random.default_rng(seed)
+    records = [{} for _ in range(n)]
+
+    for _, branch in encoder.branches:
+        if isinstance(branch, _GeoBranch):
+            idx = rng.integers(0, len(branch.centers), size=n)
+            values = branch.centers[idx] + rng.normal(scale=0.5, size=(n, len(branch.columns)))
+            for r, row in zip(records, values):
+                r.update(zip(branch.columns, row.tolist()))
+        elif isinstance(branch, _CategoricalBranch):
+            for c, lookup in zip(branch.columns, branch.lookups):
+                categories = list(lookup)
+                for r in records:
+                    r[c] = categories[rng.integers(0, len(categories))]
+                records[0][c] = "__unknown__"
+                records[1][c] = float("nan")
+                records[2][c] = None
+        else:
+            mean = branch.mean if branch.mean is not None else np.zeros(branch.width)
+            scale = branch.scale if branch.scale is not None else np.ones(branch.width)
+            values = mean + scale * rng.normal(size=(n, branch.width))
+            for r, row in zip(records, values):
+                r.update(zip(branch.columns, row.tolist()))
+            for c in branch.columns:
+                records[3][c] = None
+
+    return records
+
+
+def check_parity(encoder, preprocessing, records, rtol=1e-5, atol=1e-6):
+    """
+    Compare the compiled encoder with the sklearn transform on `records`.
+
+    Returns the maximum absolute difference; raises AssertionError when the
+    outputs disagree beyond the tolerances of the encoder dtype.
+    """
+    expected = preprocessing.transform(pd.DataFrame(records, columns=encoder.feature_names_in))
+    if hasattr(expected, "toarray"):
+        expected = expected.toarray()
+    got = encoder.transform(records).astype(np.float64)
+
+    if got.shape != expected.shape:
+        raise AssertionError(f"Shape mismatch: compiled {got.shape} vs sklearn {expected.shape}")
+    max_diff = float(np.max(np.abs(got - expected))) if got.size else 0.0
+    if not np.allclose(got, expected, rtol=rtol, atol=atol):
+        raise AssertionError(f"Compiled encoder differs from sklearn (max abs diff {max_diff:.3g})")
+    return max_diff
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    import joblib
+
+    from src.utils.helper import predict_with_proba
+
+    model_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).resolve().parents[2] / "models" / "global_best_model_optuna.pkl"
+    )
+    model = joblib.load(model_path)
+    encoder, tail = compile_pipeline(model)
+    records = parity_records(encoder, n=1000)
+
+    max_diff = check_parity(encoder, model.steps[0][1], records)
+    print(f"✓ Feature parity: {encoder.n_features_out} features, max abs diff {max_diff:.3g}")
+
+    labels, probs = predict_with_proba(model, pd.DataFrame(records, columns=encoder.feature_names_in))
+    fast_labels, fast_probs = predict_with_proba(tail, encoder.transform(records))
+    print(f"✓ Label agreement: {float(np.mean(labels == fast_labels)):.4%}")
+    if probs is not None:
+        print(f"  Max probability diff: {np.max(np.abs(probs - fast_probs)):.3g}")
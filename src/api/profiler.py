@@ -0,0 +1,79 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler that can be switched on and off at runtime.
+
+    A background thread snapshots the stack of every other thread each
+    `interval` seconds and counts identical stacks. `collapsed` returns them
+    in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self.interval = 0.005
+        self.started_at = None
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.interval = interval
+            self.started_at = time.time()
+            self.samples = 0
+            self._stacks = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if self._thread is None:
+                return False
+            self._stop.set()
+            self._thread.join(timeout=1.0)
+            self._thread = None
+            return True
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self, limit=None):
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self._stacks.most_common(limit)
+        ) + "\n"
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "started_at": self.started_at,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+        }
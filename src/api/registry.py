@@ -0,0 +1,220 @@
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from src.api.encoder import CompiledEncoder, check_parity, compile_pipeline, parity_records
+from src.api.metrics import MODEL_BATCH_ROWS, stage
+from src.api.startup import warmup_record
+from src.utils.helper import load_model, predict_with_proba
+
+
+def file_fingerprint(path):
+    """(mtime_ns, size) of a file, or None if it doesn't exist."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LoadedModel:
+    """
+    A deserialized pipeline plus everything derived from it (compiled
+    encoder, version, load time). Never mutated after construction, so a
+    request that grabbed one keeps a consistent view across a reload.
+    """
+
+    def __init__(self, model, version, encoder=None, tail=None):
+        self.model = model
+        self.version = version
+        self.encoder = encoder
+        self.tail = tail
+        self.loaded_at = datetime.now(timezone.utc)
+
+        # Split preprocessing from the estimator so the two can be timed apart
+        self.preprocess, self.estimator = None, model
+        if isinstance(model, Pipeline) and len(model) > 1:
+            self.preprocess, self.estimator = model[:-1], model[-1]
+
+    @property
+    def inference_mode(self):
+        return "compiled" if self.encoder is not None else "pandas"
+
+    def score(self, records):
+        """Score a list of feature dicts and return (labels, probabilities)."""
+        MODEL_BATCH_ROWS.observe(len(records))
+
+        if self.encoder is not None:
+            Xt = self.encoder.transform(records, timer=stage)
+            with stage("estimator"):
+                return predict_with_proba(self.tail, Xt)
+
+        with stage("dataframe"):
+            X = pd.DataFrame(records)
+        if self.preprocess is None:
+            with stage("estimator"):
+                return predict_with_proba(self.model, X)
+
+        with stage("preprocess"):
+            Xt = self.preprocess.transform(X)
+        with stage("estimator"):
+            return predict_with_proba(self.estimator, Xt)
+
+
+class ModelRegistry:
+    """
+    Holds the active model and swaps in new versions off the request path.
+
+    `reload` deserializes, compiles and warms up the new pipeline before
+    replacing `current` in a single assignment; if any of that fails the old
+    model keeps serving and the error is reported in `stats`. `start` runs a
+    background thread that polls the file's mtime/size every `poll_interval`
+    seconds and reloads when it changes. Callbacks in `on_swap` run with the
+    new LoadedModel right after it becomes active.
+    """
+
+    def __init__(self, path, inference_mode="pandas", encoder_dtype="float32",
+                 poll_interval=10.0, schema_path=None):
+        self.path = path
+        self.schema_path = schema_path
+        self.inference_mode = inference_mode
+        self.encoder_dtype = encoder_dtype
+        self.poll_interval = poll_interval
+
+        self.current = None
+        self.on_swap = []
+        self.reloads = 0
+        self.last_error = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _build(self, version, warm_up=True):
+        model = load_model(self.path)
+
+        encoder, tail = None, None
+        if self.inference_mode == "compiled":
+            try:
+                encoder, tail = compile_pipeline(model, dtype=self.encoder_dtype)
+                max_diff = check_parity(encoder, model.steps[0][1], parity_records(encoder))
+                print(f"✓ Compiled encoder ready ({encoder.n_features_out} features, max abs diff {max_diff:.3g})")
+            except Exception as e:
+                encoder, tail = None, None
+                print(f"✗ Compiled encoder unavailable, falling back to pandas: {e}")
+
+        loaded = LoadedModel(model, version, encoder=encoder, tail=tail)
+        if warm_up:
+            self._warm_up(loaded)
+        return loaded
+
+    def _warm_up(self, loaded):
+        """
+        Score a synthetic row so lazy library setup (OpenMP pools, booster
+        initialization) happens before the model takes traffic. The row
+        comes from the data schema when there is one, otherwise from the
+        fitted preprocessing.
+        """
+        record = None
+        columns = getattr(loaded.model, "feature_names_in_", None)
+        if self.schema_path is not None and columns is not None:
+            record = warmup_record(self.schema_path, columns)
+        if record is None:
+            try:
+                preprocessing = loaded.model.steps[0][1]
+                record = parity_records(CompiledEncoder(preprocessing), n=4)[-1]
+            except Exception:
+                return
+        loaded.score([record])
+
+    def load(self):
+        """
+        Initial load; raises if the model can't be loaded. The warm-up is
+        left to `warm_up` so a pre-forking server can run it in each worker
+        (OpenMP thread pools don't survive fork).
+        """
+        self._fingerprint = file_fingerprint(self.path)
+        self.current = self._build(file_sha256(self.path)[:12], warm_up=False)
+        return self.current
+
+    def warm_up(self):
+        self._warm_up(self.current)
+
+    def reload(self, force=False):
+        """
+        Load the model file again and swap it in. Returns True if a new
+        version became active. Raises if the new model fails to load, in
+        which case the old one stays active.
+
+        Without `force`, nothing happens unless the file's mtime/size moved
+        and its content hash differs from the active version; a file that
+        failed to load is not retried until it changes again.
+        """
+        with self._lock:
+            fingerprint = file_fingerprint(self.path)
+            if not force and fingerprint == self._fingerprint:
+                return False
+            self._fingerprint = fingerprint
+
+            try:
+                version = file_sha256(self.path)[:12]
+                if not force and version == self.current.version:
+                    return False
+                loaded = self._build(version)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"✗ Model reload failed, keeping version {self.current.version}: {e}")
+                raise
+
+            self.last_error = None
+            previous = self.current.version
+            self.current = loaded
+            self.reloads += 1
+            print(f"✓ Model swapped: {previous} → {loaded.version}")
+            for callback in self.on_swap:
+                callback(loaded)
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception:
+                pass
+
+    def start(self):
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="model-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def stats(self):
+        current = self.current
+        return {
+            "model_version": current.version,
+            "model_loaded_at": current.loaded_at.isoformat(),
+            "inference_mode": current.inference_mode,
+            "reloads": self.reloads,
+            "watching": self._thread is not None,
+            "last_reload_error": self.last_error,
+        }
@@ -0,0 +1,98 @@
+import gc
+import os
+
+import uvicorn
+
+HOST = os.getenv("API_HOST", "0.0.0.0")
+PORT = int(os.getenv("API_PORT", "8000"))
+APP = "src.api.app:app"
+
+
+def available_cpus():
+    """CPUs this process may run on (respects container CPU sets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_workers(value):
+    """API_WORKERS: a number, or 'auto' for one worker per available CPU."""
+    if value in ("auto", "0"):
+        return available_cpus()
+    return max(1, int(value))
+
+
+def limit_worker_threads(workers, model=None):
+    """
+    Split the CPUs between workers so OpenMP/BLAS pools don't oversubscribe.
+    threadpoolctl doesn't reach LightGBM/XGBoost, which pass their own
+    n_jobs to each predict call (n_jobs=-1 means every core), so the
+    model's n_jobs are set to the worker's share as well.
+    """
+    from threadpoolctl import threadpool_limits
+
+    from src.models.budget import set_n_jobs
+
+    threads = max(1, available_cpus() // workers)
+    threadpool_limits(limits=threads)
+    if model is not None and hasattr(model, "steps"):
+        set_n_jobs(model, threads)
+    return threads
+
+
+def run_single():
+    uvicorn.run(APP, host=HOST, port=PORT)
+
+
+def run_prefork(workers):
+    """
+    Load the app (and the model) once in a gunicorn master, then fork workers.
+
+    The workers share the model pages copy-on-write. `gc.freeze()` moves
+    everything allocated at load time out of the collector's reach so
+    garbage collection in the workers doesn't write to those pages and
+    un-share them. OpenMP is only initialized after the fork (the warm-up
+    runs in each worker's startup event), since libgomp thread pools do
+    not survive fork.
+
+    Hot model reload is disabled in this mode (see PREFORKED in
+    src/api/app.py): a new model is picked up by starting a new master,
+    e.g. `kill -USR2 <master>` and then `kill -QUIT <old master>`.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class PreforkApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{HOST}:{PORT}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn_worker.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", int(os.getenv("API_WORKER_TIMEOUT", "120")))
+            self.cfg.set("post_fork", self.post_fork)
+
+        def load(self):
+            # Workers share the master's model, so they must not reload their own
+            os.environ["API_PREFORKED"] = "1"
+            from src.api.app import app
+
+            gc.freeze()
+            return app
+
+        @staticmethod
+        def post_fork(server, worker):
+            from src.api.app import registry
+
+            threads = limit_worker_threads(workers, registry.current.model)
+            server.log.info(f"Worker {worker.pid} limited to {threads} thread(s)")
+
+    print(f"Starting {workers} pre-forked workers sharing one model")
+    PreforkApplication().run()
+
+
+if __name__ == "__main__":
+    workers = resolve_workers(os.getenv("API_WORKERS", "1"))
+    if workers == 1:
+        run_single()
+    else:
+        run_prefork(workers)
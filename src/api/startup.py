@@ -0,0 +1,84 @@
+import builtins
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+# Seconds spent in each startup phase, in the order they happened
+TIMINGS = {}
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS[name] = TIMINGS.get(name, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def record_imports():
+    """
+    Time every top-level package first imported inside the block.
+
+    Nested imports are charged to the package that triggered them, so
+    `import pandas` includes numpy. Works for imports done by unpickling
+    too, since pickle resolves classes through `builtins.__import__`.
+    """
+    original = builtins.__import__
+    depth = 0
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        nonlocal depth
+        top = name.partition(".")[0]
+        if level or depth or top in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        depth += 1
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            depth -= 1
+            key = f"import {top}"
+            TIMINGS[key] = TIMINGS.get(key, 0.0) + time.perf_counter() - start
+
+    builtins.__import__ = timed_import
+    try:
+        yield
+    finally:
+        builtins.__import__ = original
+
+
+def report():
+    """Startup timings rounded to the millisecond, slowest first."""
+    return {
+        name: round(seconds, 3)
+        for name, seconds in sorted(TIMINGS.items(), key=lambda kv: -kv[1])
+    }
+
+
+def warmup_record(schema_path, columns):
+    """
+    A representative request built from data/accident_schema.json: medians
+    for numerical features and the most frequent value for categorical and
+    binary ones. Model columns the schema doesn't describe are left missing
+    so the pipeline's imputers fill them. Returns None without a schema.
+    """
+    if not schema_path.exists():
+        return None
+    with open(schema_path) as f:
+        schema = json.load(f)
+
+    values = {}
+    for col, stats in schema.get("numerical", {}).items():
+        values[col] = stats["median"]
+    for group in ("categorical", "binary"):
+        for col, info in schema.get(group, {}).items():
+            counts = info.get("value_counts", {})
+            if counts:
+                mode = max(counts, key=counts.get)
+                values[col] = int(float(mode)) if group == "binary" else mode
+
+    return {col: values.get(col) for col in columns}
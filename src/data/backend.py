@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import pandas as pd
+
+from src.data.build_database import DUCKDB_PATH, SQL_PATH, ensure_features
+
+BACKENDS = ("sqlite", "duckdb")
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+
+
+class SQLiteBackend:
+    """Reads through sqlite3; pandas builds the frame row by row."""
+
+    name = "sqlite"
+
+    def __init__(self, path=SQL_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        ensure_features(self.conn)
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def read_df(self, sql):
+        return pd.read_sql(sql, self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class DuckDBBackend:
+    """
+    Reads through DuckDB's vectorized, multi-threaded engine and hands the
+    result to pandas as Arrow. Uses the native data/accidents.duckdb file
+    written by `build_database --duckdb` when it is at least as new as the
+    SQLite database, otherwise attaches the SQLite file read-only.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path=SQL_PATH, duckdb_path=DUCKDB_PATH):
+        import duckdb
+
+        if duckdb_path.exists() and (
+            not path.exists() or duckdb_path.stat().st_mtime_ns >= path.stat().st_mtime_ns
+        ):
+            self.path = duckdb_path
+            self.conn = duckdb.connect(str(duckdb_path), read_only=True)
+            return
+
+        if duckdb_path.exists():
+            print(f"⚠️  {duckdb_path.name} is older than {path.name}, reading SQLite instead")
+        conn = sqlite3.connect(path)
+        ensure_features(conn)
+        conn.close()
+
+        self.path = path
+        self.conn = duckdb.connect()
+        self.conn.execute("INSTALL sqlite")
+        self.conn.execute("LOAD sqlite")
+        self.conn.execute(f"ATTACH '{path}' AS accidents_db (TYPE sqlite, READ_ONLY)")
+        self.conn.execute("USE accidents_db")
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def read_df(self, sql):
+        return self.conn.execute(sql).arrow().to_pandas()
+
+    def close(self):
+        self.conn.close()
+
+
+def connect(backend=None, path=SQL_PATH):
+    """Open the feature store with `backend` (default: $DB_BACKEND or sqlite)."""
+    backend = backend or DB_BACKEND
+    if backend == "sqlite":
+        return SQLiteBackend(path)
+    if backend == "duckdb":
+        return DuckDBBackend(path)
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
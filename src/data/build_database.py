@@ -1,5 +1,12 @@
+import argparse
 import duckdb
+import json
+import os
+import shutil
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -7,49 +14,220 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DATA_DIR = PROJECT_ROOT / "data"
 CSV_PATH = DATA_DIR / "US_Accidents_March23.csv"
 SQL_PATH = DATA_DIR / "accidents.db"
+DUCKDB_PATH = DATA_DIR / "accidents.duckdb"
+PARTITION_DIR = DATA_DIR / "partitions"
 
-def load_data():
-    duck = duckdb.connect()
-    df = duck.execute(f"""
+# Tables copied into the native DuckDB file by export_duckdb
+EXPORT_TABLES = (
+    "accidents",
+    "locations",
+    "weather_conditions",
+    "road_features",
+    "minor_road_features",
+    "accident_features",
+)
+
+STAGE_COLUMNS = [
+    ("accident_id", "TEXT"),
+    ("severity", "INTEGER"),
+    ("start_time", "TEXT"),
+    ("end_time", "TEXT"),
+    ("state", "TEXT"),
+    ("county", "TEXT"),
+    ("city", "TEXT"),
+    ("start_lat", "REAL"),
+    ("start_lng", "REAL"),
+    ("temperature_f", "REAL"),
+    ("visibility_mi", "REAL"),
+    ("wind_speed_mph", "REAL"),
+    ("precipitation_in", "REAL"),
+    ("weather_condition", "TEXT"),
+    ("junction", "INTEGER"),
+    ("traffic_signal", "INTEGER"),
+    ("crossing", "INTEGER"),
+    ("stop", "INTEGER"),
+    ("railway", "INTEGER"),
+    ("roundabout", "INTEGER"),
+    ("bump", "INTEGER"),
+    ("amenity", "INTEGER"),
+    ("give_way", "INTEGER"),
+    ("no_exit", "INTEGER"),
+    ("station", "INTEGER"),
+    ("traffic_calming", "INTEGER"),
+    ("turning_loop", "INTEGER"),
+    ("description", "TEXT"),
+    ("location_key", "TEXT"),
+    ("weather_key", "TEXT"),
+    ("road_features_key", "TEXT"),
+    ("minor_road_features_key", "TEXT"),
+    ("location_id", "INTEGER"),
+    ("weather_id", "INTEGER"),
+    ("road_features_id", "INTEGER"),
+    ("minor_road_features_id", "INTEGER"),
+]
+
+# table -> (id column, key column, stage columns). The key of a dimension row
+# is an md5 over its stage columns, with NULLs spelled out so they hash (and
+# therefore match) like any other value; the fact insert joins on it instead
+# of on every dimension column. The id is the low 60 bits of the same md5,
+# so any process staging the same row assigns it the same id.
+DIMENSIONS = {
+    "locations": (
+        "location_id", "location_key",
+        ("state", "county", "city", "start_lat", "start_lng"),
+    ),
+    "weather_conditions": (
+        "weather_id", "weather_key",
+        ("temperature_f", "visibility_mi", "wind_speed_mph",
+         "precipitation_in", "weather_condition"),
+    ),
+    "road_features": (
+        "road_features_id", "road_features_key",
+        ("junction", "traffic_signal", "crossing", "stop",
+         "railway", "roundabout", "bump"),
+    ),
+    "minor_road_features": (
+        "minor_road_features_id", "minor_road_features_key",
+        ("amenity", "give_way", "no_exit", "station",
+         "traffic_calming", "turning_loop"),
+    ),
+}
+
+# Bulk-load settings: a full build rebuilds the database from the CSV, so
+# durability during the build is traded for speed. Incremental loads append
+# to an existing database and keep the durability settings (see
+# DURABILITY_PRAGMAS).
+BUILD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262144,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+DURABILITY_PRAGMAS = ("journal_mode", "synchronous")
+
+STRATA_COLUMNS = ("severity", "state")
+
+def sample_filter(percent=2.0, rows=None, seed=42, stratify=(), min_per_stratum=1):
+    """
+    SQL that samples the `src` CTE built by source_query.
+
+    Rows are ranked by a hash of (accident_id, seed), so a sample is
+    reproducible for a given seed regardless of DuckDB's thread count, and
+    DuckDB evaluates it without materializing the CSV in pandas. `rows`
+    takes precedence over `percent`; with neither the full data is used.
+    With `stratify` (severity and/or state) each stratum keeps the same
+    fraction, and at least `min_per_stratum` rows, so rare severity
+    classes survive small samples.
+    """
+    key = f"hash(accident_id || '{int(seed)}')"
+
+    if rows is None and percent is None:
+        return "SELECT * FROM src"
+
+    if not stratify:
+        if rows is not None:
+            return f"SELECT * FROM src ORDER BY {key} LIMIT {int(rows)}"
+        # hash() is uniform over UBIGINT; keep the lowest `percent` of the range
+        return (
+            f"SELECT * FROM src "
+            f"WHERE {key} % 1000000 < {float(percent) * 10000:.0f}"
+        )
+
+    unknown = set(stratify) - set(STRATA_COLUMNS)
+    if unknown:
+        raise ValueError(f"Can only stratify by {STRATA_COLUMNS}, got {sorted(unknown)}")
+
+    partition = ", ".join(stratify)
+    if rows is not None:
+        fraction = f"{int(rows)} / _total_rows"
+    else:
+        fraction = f"{float(percent) / 100}"
+    return f"""
+        SELECT * EXCLUDE (_rank, _stratum_rows, _total_rows)
+        FROM (
+            SELECT
+                *,
+                row_number() OVER (PARTITION BY {partition} ORDER BY {key}) AS _rank,
+                count(*) OVER (PARTITION BY {partition}) AS _stratum_rows,
+                count(*) OVER () AS _total_rows
+            FROM src
+        )
+        WHERE _rank <= greatest(ceil(_stratum_rows * {fraction}), {int(min_per_stratum)})
+    """
+
+def _dimension_text(columns):
+    parts = ", ".join(
+        f"coalesce(CAST({col} AS VARCHAR), '\\N')" for col in columns
+    )
+    return f"concat_ws('|', {parts})"
+
+def dimension_key(columns):
+    return f"md5({_dimension_text(columns)})"
+
+def dimension_id(columns):
+    mask = (1 << 60) - 1
+    return f"CAST(md5_number({_dimension_text(columns)}) & CAST({mask} AS HUGEINT) AS BIGINT)"
+
+def source_query(csv_path=CSV_PATH, sample=None):
+    """
+    DuckDB query producing the stage columns, in STAGE_COLUMNS order.
+    `sample` holds keyword arguments for sample_filter (default: 2%).
+    Dimension keys and ids are computed after sampling, for the sampled
+    rows only.
+    """
+    keys = ",\n            ".join(
+        [f"{dimension_key(columns)} AS {key}" for _, key, columns in DIMENSIONS.values()]
+        + [f"{dimension_id(columns)} AS {id_}" for id_, _, columns in DIMENSIONS.values()]
+    )
+    return f"""
+        WITH src AS (
+            SELECT
+                ID AS accident_id,
+                Severity,
+                CAST(Start_Time AS VARCHAR) AS Start_Time,
+                CAST(End_Time AS VARCHAR) AS End_Time,
+                State,
+                County,
+                City,
+                Start_Lat,
+                Start_Lng,
+                "Temperature(F)" AS temperature_f,
+                "Visibility(mi)" AS visibility_mi,
+                "Wind_Speed(mph)" AS wind_speed_mph,
+                "Precipitation(in)" AS precipitation_in,
+                Weather_Condition,
+                CAST(Junction AS INTEGER) AS Junction,
+                CAST(Traffic_Signal AS INTEGER) AS Traffic_Signal,
+                CAST(Crossing AS INTEGER) AS Crossing,
+                CAST(Stop AS INTEGER) AS Stop,
+                CAST(Railway AS INTEGER) AS Railway,
+                CAST(Roundabout AS INTEGER) AS Roundabout,
+                CAST(Bump AS INTEGER) AS Bump,
+                CAST(Amenity AS INTEGER) AS Amenity,
+                CAST(Give_Way AS INTEGER) AS Give_Way,
+                CAST(No_Exit AS INTEGER) AS No_Exit,
+                CAST(Station AS INTEGER) AS Station,
+                CAST(Traffic_Calming AS INTEGER) AS Traffic_Calming,
+                CAST(Turning_Loop AS INTEGER) AS Turning_Loop,
+                Description
+            FROM read_csv_auto('{csv_path}')
+        )
         SELECT
-            ID AS accident_id,
-            Severity,
-            Start_Time,
-            End_Time,
-            State,
-            County,
-            City,
-            Start_Lat,
-            Start_Lng,
-            "Temperature(F)" AS temperature_f,
-            "Visibility(mi)" AS visibility_mi,
-            "Wind_Speed(mph)" AS wind_speed_mph,
-            "Precipitation(in)" AS precipitation_in,
-            Weather_Condition,
-            Junction,
-            Traffic_Signal,
-            Crossing,
-            Stop,
-            Railway,
-            Roundabout,
-            Bump,
-            Amenity,
-            Give_Way,
-            No_Exit,
-            Station,
-            Traffic_Calming,
-            Turning_Loop,
-            Description
-        FROM read_csv_auto('{CSV_PATH}')
-        USING SAMPLE 2%;
-    """).df()
+            *,
+            {keys}
+        FROM ({sample_filter(**(sample or {}))}) AS sampled
+    """
+
+def load_data(sample=None, csv_path=CSV_PATH):
+    duck = duckdb.connect()
+    df = duck.execute(source_query(csv_path, sample=sample)).df()
 
     duck.close()
 
     return df
 
-def create_stage(conn):
-    df = load_data()
+def create_stage(conn, sample=None, csv_path=CSV_PATH):
+    df = load_data(sample, csv_path)
 
     df.columns = df.columns.str.lower()
 
@@ -60,6 +238,76 @@ def create_stage(conn):
         index=False
     )
 
+def apply_build_pragmas(conn, durable=False):
+    """With `durable`, leave journaling and syncing at SQLite's safe defaults."""
+    for name, value in BUILD_PRAGMAS.items():
+        if durable and name in DURABILITY_PRAGMAS:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def create_stage_streaming(conn, batch_size=100_000, commit_rows=1_000_000,
+                           sample=None, csv_path=CSV_PATH, query=None, progress=True):
+    """
+    Stream the CSV into stg_accidents in bounded record batches.
+
+    DuckDB hands over Arrow record batches of `batch_size` rows, which are
+    bulk-inserted with executemany and committed every `commit_rows` rows,
+    so peak memory depends on the batch size, not on the size of the CSV.
+    `query` replaces the CSV query with any DuckDB query producing the
+    stage columns (the partitioned build reads Parquet this way).
+    """
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS stg_accidents")
+    cur.execute(
+        "CREATE TABLE stg_accidents ("
+        + ", ".join(f"{name} {kind}" for name, kind in STAGE_COLUMNS)
+        + ")"
+    )
+    insert = (
+        f"INSERT INTO stg_accidents VALUES "
+        f"({', '.join('?' for _ in STAGE_COLUMNS)})"
+    )
+
+    duck = duckdb.connect()
+    if query is None:
+        query = source_query(csv_path, sample=sample)
+    reader = duck.sql(query).fetch_arrow_reader(batch_size)
+
+    rows = 0
+    uncommitted = 0
+    start = time.monotonic()
+    for batch in reader:
+        cur.executemany(insert, zip(*(col.to_pylist() for col in batch.columns)))
+        rows += batch.num_rows
+        uncommitted += batch.num_rows
+
+        if uncommitted >= commit_rows:
+            conn.commit()
+            uncommitted = 0
+
+        if not progress:
+            continue
+        elapsed = time.monotonic() - start
+        print(
+            f"  staged {rows:,} rows "
+            f"({rows / elapsed:,.0f} rows/s, peak RSS {_peak_rss_mb():,.0f} MiB)"
+        )
+
+    conn.commit()
+    duck.close()
+
+    elapsed = time.monotonic() - start
+    print(f"✓ Staged {rows:,} rows in {elapsed:.1f}s")
+    return rows
+
 def create_tables(cur):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS accidents (
@@ -71,92 +319,162 @@ def create_tables(cur):
         weather_id INTEGER,
         road_features_id INTEGER,
         minor_road_features_id INTEGER,
-        description TEXT
+        description TEXT,
+        source_id TEXT UNIQUE
     );
     """)
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS locations (
         location_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        location_key TEXT UNIQUE,
         state TEXT,
         county TEXT,
         city TEXT,
         latitude REAL,
-        longitude REAL,
-        UNIQUE(state, county, city, latitude, longitude)
+        longitude REAL
     );
     """)
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS weather_conditions (
         weather_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        weather_key TEXT UNIQUE,
         temperature_f REAL,
         visibility_mi REAL,
         wind_speed_mph REAL,
         precipitation_in REAL,
-        weather_condition TEXT,
-        UNIQUE(
-            temperature_f,
-            visibility_mi,
-            wind_speed_mph,
-            precipitation_in,
-            weather_condition
-        )
+        weather_condition TEXT
     );
     """)
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS road_features (
         road_features_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        road_features_key TEXT UNIQUE,
         junction INTEGER,
         traffic_signal INTEGER,
         crossing INTEGER,
         stop INTEGER,
         railway INTEGER,
         roundabout INTEGER,
-        bump INTEGER,
-        UNIQUE(
-            junction,
-            traffic_signal,
-            crossing,
-            stop,
-            railway,
-            roundabout,
-            bump
-        )
+        bump INTEGER
     );
     """)
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS minor_road_features (
         minor_road_features_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        minor_road_features_key TEXT UNIQUE,
         amenity INTEGER,
         give_way INTEGER,
         no_exit INTEGER,
         station INTEGER,
         traffic_calming INTEGER,
-        turning_loop INTEGER,
-        UNIQUE (
-            amenity,
-            give_way,
-            no_exit,
-            station,
-            traffic_calming,
-            turning_loop
-        )
+        turning_loop INTEGER
+    );
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS load_manifest (
+        load_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_path TEXT,
+        source_size INTEGER,
+        source_mtime_ns INTEGER,
+        sample TEXT,
+        rows_staged INTEGER,
+        rows_inserted INTEGER,
+        watermark TEXT,
+        loaded_at TEXT
     );
     """)
 
+def ensure_source_ids(cur):
+    """
+    Add accidents.source_id to databases built before it existed. Rows
+    loaded back then have no source id and can't be deduplicated against.
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(accidents)")]
+    if "source_id" in columns:
+        return
+    cur.execute("ALTER TABLE accidents ADD COLUMN source_id TEXT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_accidents_source_id ON accidents(source_id)")
+    print("⚠️  accidents predates source ids; run a full rebuild to deduplicate old rows")
+
+def ensure_dimension_keys(cur):
+    """
+    Dimension tables built before surrogate keys can't be appended to:
+    their rows have no key for new facts to join on.
+    """
+    for table, (_, key, _) in DIMENSIONS.items():
+        columns = [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+        if key not in columns:
+            raise RuntimeError(
+                f"{table} has no {key} column; run a full rebuild "
+                f"(without --incremental) to migrate the database"
+            )
+
+def source_fingerprint(csv_path, sample):
+    st = Path(csv_path).stat()
+    return (
+        str(Path(csv_path).resolve()),
+        st.st_size,
+        st.st_mtime_ns,
+        json.dumps(sample or {}, sort_keys=True, default=list),
+    )
+
+def already_loaded(cur, fingerprint):
+    return cur.execute("""
+        SELECT 1 FROM load_manifest
+        WHERE source_path = ? AND source_size = ? AND source_mtime_ns = ? AND sample = ?
+        LIMIT 1
+    """, fingerprint).fetchone() is not None
+
+def discard_loaded_rows(cur):
+    """Drop staged rows whose source id is already in accidents."""
+    cur.execute("""
+        DELETE FROM stg_accidents
+        WHERE accident_id IN (SELECT source_id FROM accidents WHERE source_id IS NOT NULL)
+    """)
+    return cur.rowcount
+
+def record_load(cur, fingerprint, rows_staged, rows_inserted, source="stg_accidents"):
+    watermark = cur.execute(f"SELECT max(start_time) FROM {source}").fetchone()[0]
+    cur.execute("""
+        INSERT INTO load_manifest (
+            source_path,
+            source_size,
+            source_mtime_ns,
+            sample,
+            rows_staged,
+            rows_inserted,
+            watermark,
+            loaded_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (*fingerprint, rows_staged, rows_inserted, watermark,
+          datetime.now(timezone.utc).isoformat()))
+
 def populate_tables(cur):
+    """
+    Insert new dimension rows, then the facts. Dimensions are deduplicated
+    and looked up on their surrogate key, so every staged row resolves to
+    exactly one id per dimension through a single indexed join, NULL
+    columns included.
+    """
     cur.execute("""
         INSERT OR IGNORE INTO locations (
+            location_id,
+            location_key,
             state,
             county,
             city,
             latitude,
             longitude
         )
-        SELECT DISTINCT
+        SELECT
+            location_id,
+            location_key,
             state,
             county,
             city,
@@ -167,13 +485,17 @@ def populate_tables(cur):
     
     cur.execute("""
         INSERT OR IGNORE INTO weather_conditions (
+            weather_id,
+            weather_key,
             temperature_f,
             visibility_mi,
             wind_speed_mph,
             precipitation_in,
             weather_condition
         )
-        SELECT DISTINCT
+        SELECT
+            weather_id,
+            weather_key,
             temperature_f,
             visibility_mi,
             wind_speed_mph,
@@ -184,6 +506,8 @@ def populate_tables(cur):
     
     cur.execute("""
         INSERT OR IGNORE INTO road_features (
+            road_features_id,
+            road_features_key,
             junction,
             traffic_signal,
             crossing,
@@ -192,7 +516,9 @@ def populate_tables(cur):
             roundabout,
             bump
         )
-        SELECT DISTINCT
+        SELECT
+            road_features_id,
+            road_features_key,
             junction,
             traffic_signal,
             crossing,
@@ -205,6 +531,8 @@ def populate_tables(cur):
     
     cur.execute("""
         INSERT OR IGNORE INTO minor_road_features (
+            minor_road_features_id,
+            minor_road_features_key,
             amenity,
             give_way,
             no_exit,
@@ -212,7 +540,9 @@ def populate_tables(cur):
             traffic_calming,
             turning_loop
         )
-        SELECT DISTINCT
+        SELECT
+            minor_road_features_id,
+            minor_road_features_key,
             amenity,
             give_way,
             no_exit,
@@ -223,7 +553,7 @@ def populate_tables(cur):
                 """)
     
     cur.execute("""
-        INSERT INTO accidents (
+        INSERT OR IGNORE INTO accidents (
             severity,
             start_time,
             end_time,
@@ -231,7 +561,8 @@ def populate_tables(cur):
             weather_id,
             road_features_id,
             minor_road_features_id,
-            description
+            description,
+            source_id
         )
         SELECT
             s.severity,
@@ -241,64 +572,494 @@ def populate_tables(cur):
             w.weather_id,
             r.road_features_id,
             m.minor_road_features_id,
-            s.description
+            s.description,
+            s.accident_id
         FROM stg_accidents s
-
-        JOIN locations l
-        ON s.state = l.state
-        AND s.county = l.county
-        AND s.city = l.city
-        AND s.start_lat = l.latitude
-        AND s.start_lng = l.longitude
-
-        JOIN weather_conditions w
-        ON s.temperature_f = w.temperature_f
-        AND s.visibility_mi = w.visibility_mi
-        AND s.wind_speed_mph = w.wind_speed_mph
-        AND s.precipitation_in = w.precipitation_in
-        AND s.weather_condition = w.weather_condition
-
-        JOIN road_features r
-        ON s.junction = r.junction
-        AND s.traffic_signal = r.traffic_signal
-        AND s.crossing = r.crossing
-        AND s.stop = r.stop
-        AND s.railway = r.railway
-        AND s.roundabout = r.roundabout
-        AND s.bump = r.bump
-
-        JOIN minor_road_features m
-        ON s.amenity = m.amenity
-        AND s.give_way = m.give_way
-        AND s.no_exit = m.no_exit
-        AND s.station = m.station
-        AND s.traffic_calming = m.traffic_calming
-        AND s.turning_loop = m.turning_loop;
+        JOIN locations l ON l.location_key = s.location_key
+        JOIN weather_conditions w ON w.weather_key = s.weather_key
+        JOIN road_features r ON r.road_features_key = s.road_features_key
+        JOIN minor_road_features m ON m.minor_road_features_key = s.minor_road_features_key;
         """)
     
+def refresh_features(cur):
+    """
+    Bring accident_features up to date with accidents and return the number
+    of rows added.
+
+    accident_features is the denormalized training table read by
+    load_database: one row per labelled accident with the time features
+    already extracted, so the 4-way join and strftime calls run once per
+    accident at build time instead of on every read. Only accidents newer
+    than the last materialized one are added; accident ids come from
+    AUTOINCREMENT and never go backwards. is_weekend/is_night are plain
+    columns rather than generated ones so that readers going through
+    DuckDB's sqlite extension, which only lists regular columns, see them.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS accident_features (
+        accident_id INTEGER PRIMARY KEY,
+        severity INTEGER,
+        hour INTEGER,
+        day INTEGER,
+        month INTEGER,
+        is_weekend INTEGER,
+        is_night INTEGER,
+        state TEXT,
+        latitude REAL,
+        longitude REAL,
+        temperature_f REAL,
+        visibility_mi REAL,
+        wind_speed_mph REAL,
+        precipitation_in REAL,
+        weather_condition TEXT,
+        junction INTEGER,
+        traffic_signal INTEGER,
+        crossing INTEGER,
+        stop INTEGER,
+        railway INTEGER,
+        roundabout INTEGER,
+        bump INTEGER
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_accident_features_severity ON accident_features(severity)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_accident_features_state ON accident_features(state)")
+
+    last = cur.execute("SELECT coalesce(max(accident_id), 0) FROM accident_features").fetchone()[0]
+    cur.execute("""
+        INSERT INTO accident_features (
+            accident_id,
+            severity,
+            hour,
+            day,
+            month,
+            is_weekend,
+            is_night,
+            state,
+            latitude,
+            longitude,
+            temperature_f,
+            visibility_mi,
+            wind_speed_mph,
+            precipitation_in,
+            weather_condition,
+            junction,
+            traffic_signal,
+            crossing,
+            stop,
+            railway,
+            roundabout,
+            bump
+        )
+        SELECT
+            a.accident_id,
+            a.severity,
+            a.hour,
+            a.day,
+            a.month,
+            CASE WHEN a.day IN (0, 6) THEN 1 ELSE 0 END,
+            CASE WHEN a.hour BETWEEN 20 AND 23 OR a.hour BETWEEN 0 AND 5 THEN 1 ELSE 0 END,
+            l.state,
+            l.latitude,
+            l.longitude,
+            w.temperature_f,
+            w.visibility_mi,
+            w.wind_speed_mph,
+            w.precipitation_in,
+            w.weather_condition,
+            r.junction,
+            r.traffic_signal,
+            r.crossing,
+            r.stop,
+            r.railway,
+            r.roundabout,
+            r.bump
+        FROM (
+            SELECT
+                accident_id,
+                severity,
+                location_id,
+                weather_id,
+                road_features_id,
+                CAST(strftime('%H', start_time) AS INTEGER) AS hour,
+                CAST(strftime('%w', start_time) AS INTEGER) AS day,
+                CAST(strftime('%m', start_time) AS INTEGER) AS month
+            FROM accidents
+            WHERE severity IS NOT NULL
+            AND accident_id > ?
+        ) a
+        JOIN locations l ON a.location_id = l.location_id
+        JOIN weather_conditions w ON a.weather_id = w.weather_id
+        JOIN road_features r ON a.road_features_id = r.road_features_id;
+    """, (last,))
+    return cur.rowcount
+
+def ensure_features(conn):
+    """Materialize accident_features for databases built before it existed."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accident_features'"
+    ).fetchone()
+    if exists is None:
+        print("⚙️  Materializing accident_features (one-off for this database)")
+        refresh_features(conn.cursor())
+        conn.commit()
+
+def export_duckdb(sqlite_path=SQL_PATH, duckdb_path=DUCKDB_PATH):
+    """
+    Copy the SQLite tables into a native DuckDB file for the duckdb storage
+    backend. Written next to the target and renamed, so readers never see
+    a half-written file.
+    """
+    tmp = duckdb_path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+
+    duck = duckdb.connect(str(tmp))
+    duck.execute("INSTALL sqlite")
+    duck.execute("LOAD sqlite")
+    duck.execute(f"ATTACH '{sqlite_path}' AS src (TYPE sqlite, READ_ONLY)")
+    for table in EXPORT_TABLES:
+        duck.execute(f"CREATE TABLE {table} AS SELECT * FROM src.{table}")
+    duck.close()
+
+    tmp.replace(duckdb_path)
+    print(f"✓ Exported {', '.join(EXPORT_TABLES)} to {duckdb_path}")
+
 def drop_all_tables(cur):
     cur.executescript("""
+        DROP TABLE IF EXISTS accident_features;
         DROP TABLE IF EXISTS accidents;
         DROP TABLE IF EXISTS minor_road_features;
         DROP TABLE IF EXISTS road_features;
         DROP TABLE IF EXISTS weather_conditions;
         DROP TABLE IF EXISTS locations;
         DROP TABLE IF EXISTS stg_accidents;
+        DROP TABLE IF EXISTS load_manifest;
+    """)
+
+def partition_source(workers, partition_by="state", sample=None, csv_path=CSV_PATH,
+                     out_dir=PARTITION_DIR):
+    """
+    Read and sample the CSV once, writing the stage rows as Parquet split by
+    state (or into `workers` hash shards of accident_id), and group the
+    pieces into at most `workers` partitions of similar size. States are
+    assigned largest first to the lightest partition, so a big state such
+    as CA bounds the speed-up; shards are balanced by construction.
+    """
+    if partition_by == "state":
+        part = "coalesce(state, '')"
+    elif partition_by == "shard":
+        part = f"hash(accident_id) % {int(workers)}"
+    else:
+        raise ValueError(f"Can only partition by state or shard, got {partition_by!r}")
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+
+    duck = duckdb.connect()
+    duck.execute(f"""
+        COPY (
+            SELECT *, {part} AS _part
+            FROM ({source_query(csv_path, sample=sample)})
+        )
+        TO '{out_dir / "stage"}' (FORMAT PARQUET, PARTITION_BY (_part))
     """)
+    duck.close()
+
+    pieces = sorted(
+        ((sum(f.stat().st_size for f in d.glob("*.parquet")), sorted(d.glob("*.parquet")))
+         for d in (out_dir / "stage").iterdir() if d.is_dir()),
+        key=lambda piece: -piece[0],
+    )
+    partitions = [[0, []] for _ in range(min(workers, len(pieces)))]
+    for size, files in pieces:
+        lightest = min(partitions, key=lambda p: p[0])
+        lightest[0] += size
+        lightest[1] += files
+    return [files for _, files in partitions]
+
+def build_partition(part, files, batch_size=100_000, out_dir=PARTITION_DIR):
+    """
+    Worker: stage one partition's Parquet files into its own SQLite file and
+    resolve its dimensions and facts there. Dimension ids come from the
+    staged rows, so every partition agrees on them.
+    """
+    path = out_dir / f"part_{part:03d}.db"
+    path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(path)
+    apply_build_pragmas(conn)
+    cur = conn.cursor()
+    create_tables(cur)
+
+    columns = ", ".join(name for name, _ in STAGE_COLUMNS)
+    sources = ", ".join(f"'{f}'" for f in files)
+    rows = create_stage_streaming(
+        conn,
+        batch_size=batch_size,
+        query=f"SELECT {columns} FROM read_parquet([{sources}])",
+        progress=False,
+    )
+    populate_tables(cur)
+    cur.execute("DROP TABLE stg_accidents")
+    conn.commit()
+    conn.close()
+    return path, rows
 
-def create_3nf(full_reset=True):
+def merge_partition(conn, path):
+    """
+    Append one partition database to the main one. Dimension rows are
+    copied with their ids (rows already present, e.g. weather shared by
+    two states, are ignored), facts with the ids they already point to;
+    no joins are needed. Returns the number of accidents added.
+    """
+    cur = conn.cursor()
+    cur.execute("ATTACH DATABASE ? AS part", (str(path),))
+    for table in DIMENSIONS:
+        cur.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM part.{table}")
+    cur.execute("""
+        INSERT OR IGNORE INTO accidents (
+            severity,
+            start_time,
+            end_time,
+            location_id,
+            weather_id,
+            road_features_id,
+            minor_road_features_id,
+            description,
+            source_id
+        )
+        SELECT
+            severity,
+            start_time,
+            end_time,
+            location_id,
+            weather_id,
+            road_features_id,
+            minor_road_features_id,
+            description,
+            source_id
+        FROM part.accidents
+        ORDER BY accident_id;
+    """)
+    rows = cur.rowcount
+    conn.commit()
+    cur.execute("DETACH DATABASE part")
+    return rows
+
+def create_3nf(full_reset=True, stream=False, batch_size=100_000, sample=None,
+               csv_path=CSV_PATH, incremental=False, to_duckdb=False):
+    """
+    Build the 3NF database from `csv_path`.
+
+    With `to_duckdb`, the tables are also copied to data/accidents.duckdb for
+    the duckdb storage backend; an existing copy is always refreshed so it
+    never falls behind the SQLite file.
+
+    With `incremental`, nothing is dropped: a CSV already recorded in
+    load_manifest (same path, size, mtime and sampling) is skipped, staged
+    rows whose source id is already in accidents are discarded, and only
+    new dimension and fact rows are inserted.
+    """
     conn = sqlite3.connect(SQL_PATH)
     cur = conn.cursor()
 
-    if full_reset:
+    if full_reset and not incremental:
         drop_all_tables(cur)
 
-    create_stage(conn)
     create_tables(cur)
+    ensure_source_ids(cur)
+    ensure_dimension_keys(cur)
+
+    fingerprint = source_fingerprint(csv_path, sample)
+    if incremental and already_loaded(cur, fingerprint):
+        print(f"✓ {csv_path} is already loaded, nothing to do")
+        conn.close()
+        return
+
+    if stream:
+        # An interrupted append must not corrupt the database it extends
+        apply_build_pragmas(conn, durable=incremental)
+        rows_staged = create_stage_streaming(
+            conn, batch_size=batch_size, sample=sample, csv_path=csv_path
+        )
+    else:
+        create_stage(conn, sample=sample, csv_path=csv_path)
+        rows_staged = cur.execute("SELECT count(*) FROM stg_accidents").fetchone()[0]
+
+    if incremental:
+        skipped = discard_loaded_rows(cur)
+        print(f"  {skipped:,} of {rows_staged:,} staged rows were already loaded")
+
+    before = cur.execute("SELECT count(*) FROM accidents").fetchone()[0]
     populate_tables(cur)
+    rows_inserted = cur.execute("SELECT count(*) FROM accidents").fetchone()[0] - before
+    record_load(cur, fingerprint, rows_staged, rows_inserted)
+    print(f"✓ Inserted {rows_inserted:,} accidents from {csv_path}")
+    features = refresh_features(cur)
+    print(f"✓ Materialized {features:,} rows into accident_features")
+
+    conn.commit()
+    conn.close()
+
+    if to_duckdb or DUCKDB_PATH.exists():
+        export_duckdb()
+
+def create_3nf_partitioned(workers=None, partition_by="state", batch_size=100_000,
+                           sample=None, csv_path=CSV_PATH, to_duckdb=False):
+    """
+    Full rebuild with ingest and dimension resolution spread over `workers`
+    processes (default: one per core). The CSV is sampled and split in one
+    DuckDB pass, each worker builds its partition into its own SQLite file,
+    and the partitions are merged into the main database in a fixed order
+    while later ones are still building, so the result doesn't depend on
+    which worker finishes first.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.monotonic()
+
+    partitions = partition_source(workers, partition_by, sample=sample, csv_path=csv_path)
+    print(f"✓ Split the source into {len(partitions)} partitions by {partition_by} "
+          f"({time.monotonic() - start:.1f}s)")
+
+    conn = sqlite3.connect(SQL_PATH)
+    apply_build_pragmas(conn)
+    cur = conn.cursor()
+    drop_all_tables(cur)
+    create_tables(cur)
+
+    rows_staged = 0
+    rows_inserted = 0
+    with ProcessPoolExecutor(max_workers=max(1, len(partitions))) as pool:
+        futures = [
+            pool.submit(build_partition, part, files, batch_size)
+            for part, files in enumerate(partitions)
+        ]
+        for future in futures:
+            path, rows = future.result()
+            rows_staged += rows
+            rows_inserted += merge_partition(conn, path)
+            path.unlink()
+            print(f"  merged {path.name}: {rows_inserted:,} accidents so far "
+                  f"({time.monotonic() - start:.1f}s)")
+
+    record_load(cur, source_fingerprint(csv_path, sample), rows_staged, rows_inserted,
+                source="accidents")
+    print(f"✓ Inserted {rows_inserted:,} accidents from {csv_path}")
+    features = refresh_features(cur)
+    print(f"✓ Materialized {features:,} rows into accident_features")
 
     conn.commit()
     conn.close()
+    shutil.rmtree(PARTITION_DIR, ignore_errors=True)
+
+    if to_duckdb or DUCKDB_PATH.exists():
+        export_duckdb()
 
 if __name__ == "__main__":
-    create_3nf()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Build the 3NF accidents database from the CSV"
+    )
+    parser.add_argument(
+        "--csv",
+        type=Path,
+        default=CSV_PATH,
+        help="Source CSV (default: data/US_Accidents_March23.csv)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append new accidents instead of dropping and rebuilding every table"
+    )
+    parser.add_argument(
+        "--duckdb",
+        action="store_true",
+        help="Also export the tables to data/accidents.duckdb for the duckdb backend"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Build in parallel partitions with this many processes (0: one per core)"
+    )
+    parser.add_argument(
+        "--partition-by",
+        choices=("state", "shard"),
+        default="state",
+        help="How to split the data between workers (default: state)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the CSV into SQLite in bounded batches instead of via pandas"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100_000,
+        help="Rows per record batch in streaming mode"
+    )
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument(
+        "--percent",
+        type=float,
+        default=2.0,
+        help="Sample this percentage of the CSV (default: 2)"
+    )
+    sampling.add_argument(
+        "--rows",
+        type=int,
+        default=None,
+        help="Sample this many rows instead of a percentage"
+    )
+    sampling.add_argument(
+        "--full",
+        action="store_true",
+        help="Load the whole CSV without sampling"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed that makes the sample reproducible"
+    )
+    parser.add_argument(
+        "--stratify",
+        nargs="+",
+        choices=STRATA_COLUMNS,
+        default=(),
+        help="Sample the same fraction from every severity and/or state stratum"
+    )
+    parser.add_argument(
+        "--min-per-stratum",
+        type=int,
+        default=1,
+        help="Keep at least this many rows of every stratum"
+    )
+    args = parser.parse_args()
+
+    sample = {
+        "percent": None if (args.full or args.rows) else args.percent,
+        "rows": None if args.full else args.rows,
+        "seed": args.seed,
+        "stratify": tuple(args.stratify),
+        "min_per_stratum": args.min_per_stratum,
+    }
+    if args.workers != 1:
+        if args.incremental:
+            parser.error("--workers only supports full rebuilds, not --incremental")
+        create_3nf_partitioned(
+            workers=args.workers or None,
+            partition_by=args.partition_by,
+            batch_size=args.batch_size,
+            sample=sample,
+            csv_path=args.csv,
+            to_duckdb=args.duckdb,
+        )
+    else:
+        create_3nf(
+            stream=args.stream,
+            batch_size=args.batch_size,
+            sample=sample,
+            csv_path=args.csv,
+            incremental=args.incremental,
+            to_duckdb=args.duckdb,
+        )
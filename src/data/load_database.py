@@ -1,61 +1,163 @@
-import sqlite3
+import hashlib
+import json
+import os
 import pandas as pd
 from pathlib import Path
-from src.data.build_database import SQL_PATH
+from src.data.backend import connect
+from src.data.build_database import DATA_DIR, SQL_PATH
+from src.utils.build_schema import BINARY_COLS, CATEGORICAL_COLS, NUMERICAL_COLS
 
-def load_database():
-    conn = sqlite3.connect(SQL_PATH)
-    
-    accidents = """
+FEATURE_CACHE_PATH = DATA_DIR / "features.arrow"
+
+def feature_query(with_id=False):
+    """The feature SQL used for training; `with_id` also selects accident_id."""
+    return f"""
     SELECT
-        a.severity,
-
-        CAST(strftime('%H', a.start_time) AS INTEGER) AS hour,
-        CAST(strftime('%w', a.start_time) AS INTEGER) AS day,
-        CAST(strftime('%m', a.start_time) AS INTEGER) AS month,
-
-        CASE
-        WHEN CAST(strftime('%w', a.start_time) AS INTEGER) IN (0,6)
-        THEN 1 ELSE 0
-        END AS is_weekend,
-
-        CASE
-        WHEN CAST(strftime('%H', a.start_time) AS INTEGER) BETWEEN 20 AND 23
-            OR CAST(strftime('%H', a.start_time) AS INTEGER) BETWEEN 0 AND 5
-        THEN 1 ELSE 0
-        END AS is_night,
-
-        l.state,
-        l.latitude,
-        l.longitude,
-
-        w.temperature_f,
-        w.visibility_mi,
-        w.wind_speed_mph,
-        w.precipitation_in,
-        w.weather_condition,
-
-        r.junction,
-        r.traffic_signal,
-        r.crossing,
-        r.stop,
-        r.railway,
-        r.roundabout,
-        r.bump
-        
-    FROM accidents a
-    JOIN locations l
-    ON a.location_id = l.location_id
-    JOIN weather_conditions w
-    ON a.weather_id = w.weather_id
-    JOIN road_features r
-    ON a.road_features_id = r.road_features_id
-    WHERE a.severity IS NOT NULL;
+        {"accident_id," if with_id else ""}
+        severity,
+
+        hour,
+        day,
+        month,
+        is_weekend,
+        is_night,
+
+        state,
+        latitude,
+        longitude,
+
+        temperature_f,
+        visibility_mi,
+        wind_speed_mph,
+        precipitation_in,
+        weather_condition,
+
+        junction,
+        traffic_signal,
+        crossing,
+        stop,
+        railway,
+        roundabout,
+        bump
+
+    FROM accident_features;
+    """
+
+def read_features(db_path=SQL_PATH, backend=None):
+    store = connect(backend, db_path)
+    df = store.read_df(feature_query())
+    store.close()
+
+    return df
+
+def compact_dtypes(df, verbose=True):
+    """
+    Shrink the training frame using the schema's column groups: float32 for
+    numerical columns (the smallest exact int type when they hold whole
+    numbers), int8 for binary flags, categoricals for strings. Columns with
+    missing values keep a float type so the imputers still see NaN. Any
+    other integer column (day, severity) is downcast as well.
+    """
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+
+    for col in NUMERICAL_COLS:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        else:
+            df[col] = df[col].astype("float32")
+
+    for col in BINARY_COLS:
+        if df[col].isna().any():
+            df[col] = df[col].astype("float32")
+        else:
+            df[col] = df[col].astype("int8")
+
+    for col in CATEGORICAL_COLS:
+        df[col] = df[col].astype("category")
+
+    grouped = set(NUMERICAL_COLS + BINARY_COLS + CATEGORICAL_COLS)
+    for col in df.columns.difference(list(grouped)):
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    if verbose:
+        after = df.memory_usage(deep=True).sum()
+        print(
+            f"🗜️  Compacted dtypes: {before / 2**20:,.1f} MiB → "
+            f"{after / 2**20:,.1f} MiB ({after / before:.0%})"
+        )
+    return df
+
+def database_fingerprint(db_path=SQL_PATH):
+    """Identifies one state of the database and of the feature query."""
+    st = Path(db_path).stat()
+    return json.dumps({
+        "db": str(Path(db_path).resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "query": hashlib.sha256(feature_query().encode()).hexdigest()[:12],
+    }, sort_keys=True)
+
+def read_feature_cache(fingerprint, cache_path=FEATURE_CACHE_PATH):
+    """The cached frame if it was written for `fingerprint`, else None."""
+    import pyarrow.feather as feather
+
+    if not cache_path.exists():
+        return None
+    table = feather.read_table(cache_path, memory_map=True)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"db_fingerprint", b"").decode() != fingerprint:
+        return None
+    # One block per column and the Arrow buffers released as they are
+    # converted, so numeric columns stay views onto the mapped file
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def write_feature_cache(df, fingerprint, cache_path=FEATURE_CACHE_PATH):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"db_fingerprint": fingerprint.encode(),
+    })
+    # Uncompressed so later reads can memory-map the columns without copying
+    tmp = cache_path.with_suffix(".tmp")
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, cache_path)
+
+def load_database(use_cache=True, db_path=SQL_PATH, cache_path=FEATURE_CACHE_PATH,
+                  backend=None, compact=False):
     """
+    The training frame. With `use_cache`, it is served from an Arrow
+    snapshot next to the database, which is rewritten whenever the
+    database file (or the feature query) changes. `backend` picks the
+    storage backend used to read it (see src.data.backend). With `compact`
+    the frame goes through compact_dtypes after loading.
+    """
+    df = _load_features(use_cache, db_path, cache_path, backend)
+    return compact_dtypes(df) if compact else df
+
+def _load_features(use_cache, db_path, cache_path, backend):
+    if not use_cache:
+        return read_features(db_path, backend)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("⚠️  pyarrow not installed, reading features from the database")
+        return read_features(db_path, backend)
 
-    df = pd.read_sql(accidents, conn)
-    conn.close()
+    fingerprint = database_fingerprint(db_path)
+    df = read_feature_cache(fingerprint, cache_path)
+    if df is not None:
+        print(f"✓ Loaded {len(df):,} rows from the feature cache {cache_path.name}")
+        return df
 
+    df = read_features(db_path, backend)
+    write_feature_cache(df, fingerprint, cache_path)
+    print(f"✓ Wrote the feature cache {cache_path.name} ({len(df):,} rows)")
     return df
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+import argparse
+import time
+
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+
+from src.data.load_database import load_database
+from src.models.budget import ThreadBudget, cpu_budget
+from src.models.cache import cached_cross_validate, fold_transforms
+from src.models.train import OUTPUT, SCORERS
+from src.utils.pipelines import build_preprocessing, make_estimator_for_name
+
+FOLDS = 5
+
+
+def budget_splits(cores, n_folds=FOLDS):
+    """Every distinct (CV processes, threads per fit) split of `cores`."""
+    splits = {}
+    for outer in range(1, min(cores, n_folds) + 1):
+        splits.setdefault((outer, cores // outer), outer)
+    return list(splits.values())
+
+
+def benchmark(name, X, y, cores, repeats=1):
+    """
+    Time a FOLDS-fold CV of `name` under each thread split, with the
+    preprocessing already cached so only the estimator fits are measured.
+    """
+    pipeline = make_pipeline(build_preprocessing(50), make_estimator_for_name(name, 4))
+    fold_transforms(pipeline[0], X, y, FOLDS)
+
+    rows = []
+    for cv_jobs in budget_splits(cores) + ["auto"]:
+        budget = ThreadBudget(cores, cv_jobs)
+        outer, inner = budget.split(pipeline, FOLDS)
+        timings = []
+        for _ in range(repeats):
+            candidate = clone(pipeline)
+            start = time.perf_counter()
+            with budget.cv(candidate, FOLDS) as n_jobs:
+                cached_cross_validate(candidate, X, y, cv=FOLDS, scoring=SCORERS, n_jobs=n_jobs)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        rows.append((str(cv_jobs), outer, inner, best, FOLDS / best))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare CV throughput across splits of the core budget"
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=["lightgbm", "xgboost", "logistic"],
+        help="Model families to benchmark"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=50_000,
+        help="Training rows to sample from the feature table"
+    )
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=None,
+        help="Core budget to split (default: every core available)"
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=1,
+        help="Runs per split; the fastest is reported"
+    )
+    args = parser.parse_args()
+
+    df = load_database()
+    if args.rows < len(df):
+        df, _ = train_test_split(
+            df, train_size=args.rows, stratify=df[OUTPUT], random_state=42
+        )
+    X = df.drop(columns=[OUTPUT])
+    y = df[OUTPUT].astype(int) - 1
+    cores = cpu_budget(args.cpus)
+
+    print(f"📊 {FOLDS}-fold CV on {len(X):,} rows with {cores} cores")
+    for name in args.models:
+        print(f"\n{name}")
+        print(f"{'cv_jobs':>8} {'procs':>6} {'threads':>8} {'seconds':>9} {'fits/s':>8}")
+        for cv_jobs, outer, inner, seconds, rate in benchmark(name, X, y, cores, args.repeats):
+            print(f"{cv_jobs:>8} {outer:>6} {inner:>8} {seconds:>9.2f} {rate:>8.2f}")
@@ -0,0 +1,132 @@
+import os
+from contextlib import contextmanager
+
+# Estimator libraries whose fits are multithreaded through their own n_jobs
+THREADED_LIBRARIES = ("xgboost", "lightgbm")
+
+
+def cpu_budget(cpus=None):
+    """Cores available to this process (respects CPU affinity), or `cpus`."""
+    if cpus:
+        return cpus
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _n_jobs_params(estimator):
+    params = estimator.get_params(deep=True)
+    return {key: value for key, value in params.items()
+            if key == "n_jobs" or key.endswith("__n_jobs")}
+
+
+def _sync_fitted(step):
+    # A wrapper (EarlyStoppingClassifier) keeps its fitted estimator apart
+    # from its parameters; give it the template's n_jobs as well
+    fitted = getattr(step, "estimator_", None)
+    template = getattr(step, "estimator", None)
+    if fitted is not None and template is not None:
+        fitted.set_params(**_n_jobs_params(template))
+
+
+def set_n_jobs(pipeline, n_jobs):
+    """
+    Set n_jobs on every step after the preprocessing that has one, including
+    estimators wrapped by another (EarlyStoppingClassifier), and return the
+    previous values for `restore_n_jobs`. The preprocessing is left alone:
+    its parameters key the transform cache.
+    """
+    previous = []
+    for _, step in pipeline.steps[1:]:
+        params = _n_jobs_params(step)
+        if params:
+            previous.append((step, params))
+            step.set_params(**{key: n_jobs for key in params})
+            _sync_fitted(step)
+    return previous
+
+
+def restore_n_jobs(previous):
+    """Undo a `set_n_jobs` call, on estimators fitted in between as well."""
+    for step, params in previous:
+        step.set_params(**params)
+        _sync_fitted(step)
+
+
+@contextmanager
+def sized(pipeline, n_jobs):
+    """Run the block with `pipeline` set to n_jobs, then put the old values back."""
+    previous = set_n_jobs(pipeline, n_jobs)
+    try:
+        yield pipeline
+    finally:
+        # Fitted estimators keep n_jobs and would be pickled with this
+        # machine's core count otherwise
+        restore_n_jobs(previous)
+
+
+def is_threaded(pipeline):
+    estimator = pipeline.steps[-1][1]
+    estimator = getattr(estimator, "estimator", estimator)
+    return type(estimator).__module__.partition(".")[0] in THREADED_LIBRARIES
+
+
+class ThreadBudget:
+    """
+    How many cores one training task may use, and how CV splits them.
+
+    Every fit inside a CV loop runs in one of `cv_jobs` processes with
+    cores // cv_jobs threads (booster n_jobs and BLAS/OpenMP pools alike),
+    so folds × threads never exceeds the budget. With cv_jobs="auto",
+    XGBoost/LightGBM pipelines run folds one at a time on all cores, since
+    boosters scale well across threads, and everything else runs one fold
+    per core.
+    """
+
+    def __init__(self, cores=None, cv_jobs="auto"):
+        self.cores = cpu_budget(cores)
+        self.cv_jobs = cv_jobs if cv_jobs == "auto" else int(cv_jobs)
+
+    def __repr__(self):
+        return f"ThreadBudget(cores={self.cores}, cv_jobs={self.cv_jobs!r})"
+
+    def split(self, pipeline, n_folds):
+        """(CV processes, threads per fit) for cross-validating `pipeline`."""
+        if self.cv_jobs == "auto":
+            outer = 1 if is_threaded(pipeline) else n_folds
+        else:
+            outer = int(self.cv_jobs)
+        outer = max(1, min(outer, n_folds, self.cores))
+        return outer, max(1, self.cores // outer)
+
+    @contextmanager
+    def cv(self, pipeline, n_folds):
+        """
+        Size `pipeline` for CV and yield the n_jobs to give the CV loop,
+        restoring its n_jobs values on exit. Inner thread pools of the CV
+        worker processes are capped through joblib's inner_max_num_threads.
+        """
+        from joblib import parallel_backend
+        from threadpoolctl import threadpool_limits
+
+        outer, inner = self.split(pipeline, n_folds)
+        with sized(pipeline, inner):
+            if outer > 1:
+                with parallel_backend("loky", inner_max_num_threads=inner):
+                    yield outer
+            else:
+                with threadpool_limits(inner):
+                    yield outer
+
+    @contextmanager
+    def fit(self, pipeline):
+        """
+        Size `pipeline` for a single fit on every core of the budget. Its
+        n_jobs values are restored afterwards, so the fitted pipeline is
+        saved with the ones it was built with.
+        """
+        from threadpoolctl import threadpool_limits
+
+        with sized(pipeline, self.cores), threadpool_limits(self.cores):
+            yield
@@ -0,0 +1,154 @@
+import os
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import check_cv
+from sklearn.pipeline import Pipeline
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+CACHE_DIR = Path(os.getenv("PREPROCESSING_CACHE_DIR", PROJECT_ROOT / ".cache" / "preprocessing"))
+CACHE_ENABLED = os.getenv("PREPROCESSING_CACHE", "1") != "0"
+
+# Entries loaded or computed in this process, by content hash
+_MEMORY = {}
+
+
+# Bump when preprocessing code changes in a way its parameters don't show
+CACHE_VERSION = 1
+
+
+def _cache_key(*parts):
+    return joblib.hash((CACHE_VERSION, sklearn.__version__) + parts)
+
+
+def _cached(key, compute):
+    """
+    Look `key` up in memory, then on disk, and only call `compute` when
+    both miss. Disk entries are written to a temporary name and renamed,
+    so parallel runs never read half a file.
+    """
+    if key in _MEMORY:
+        return _MEMORY[key]
+
+    path = CACHE_DIR / f"{key}.joblib"
+    if CACHE_ENABLED and path.exists():
+        try:
+            value = joblib.load(path)
+        except Exception:
+            value = None
+        if value is not None:
+            _MEMORY[key] = value
+            return value
+
+    value = compute()
+    _MEMORY[key] = value
+    if CACHE_ENABLED:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        joblib.dump(value, tmp)
+        os.replace(tmp, path)
+    return value
+
+
+def split_pipeline(pipeline):
+    """(preprocessing, rest) of a pipeline whose first step is the preprocessing."""
+    if not isinstance(pipeline, Pipeline) or len(pipeline) < 2:
+        raise ValueError("Expected a pipeline of preprocessing followed by an estimator")
+    return pipeline[0], pipeline[1:]
+
+
+def _transform_fold(preprocessing, X, y, train_idx, test_idx):
+    Xt_train = preprocessing.fit_transform(X.iloc[train_idx], y.iloc[train_idx])
+    return Xt_train, y.iloc[train_idx], preprocessing.transform(X.iloc[test_idx]), y.iloc[test_idx]
+
+
+def fold_transforms(preprocessing, X, y, cv, n_jobs=-1):
+    """
+    Preprocessing fitted on each training fold of `cv` and applied to both
+    sides of the split, as [(Xt_train, y_train, Xt_test, y_test), ...].
+
+    Keyed on the content of X and y, the preprocessing parameters and the
+    split, so every trial and model family evaluated on the same folds
+    shares one fit per fold, across runs as well.
+    """
+    cv = check_cv(cv, y, classifier=True)
+    preprocessing = clone(preprocessing)
+    key = _cache_key("folds", X, y, preprocessing, cv)
+
+    def compute():
+        return Parallel(n_jobs=n_jobs)(
+            delayed(_transform_fold)(clone(preprocessing), X, y, train_idx, test_idx)
+            for train_idx, test_idx in cv.split(X, y)
+        )
+
+    return _cached(key, compute)
+
+
+def fitted_preprocessing(preprocessing, X, y):
+    """Preprocessing fitted on all of X, plus X transformed, cached like the folds."""
+    preprocessing = clone(preprocessing)
+    key = _cache_key("full", X, y, preprocessing)
+
+    def compute():
+        fitted = clone(preprocessing)
+        return fitted, fitted.fit_transform(X, y)
+
+    return _cached(key, compute)
+
+
+def _fit_and_score(estimator, X_train, y_train, X_test, y_test, scorers):
+    estimator.fit(X_train, y_train)
+    return {name: scorer(estimator, X_test, y_test) for name, scorer in scorers.items()}
+
+
+def _collect(scores, scorers):
+    return {f"test_{name}": np.array([s[name] for s in scores]) for name in scorers}
+
+
+def cached_cross_validate(pipeline, X, y, cv=5, scoring=None, n_jobs=-1, on_fold=None):
+    """
+    Drop-in for sklearn's cross_validate(pipeline, X, y, cv=cv,
+    scoring=scoring) returning the same "test_<name>" arrays. The first
+    pipeline step is served from the transform cache; only the remaining
+    steps (PCA, the estimator) are fitted per fold.
+
+    With `on_fold`, folds are scored one at a time in this process and
+    on_fold(i, results_so_far) is called after each; it may raise to stop
+    the remaining folds (e.g. Optuna pruning).
+    """
+    preprocessing, rest = split_pipeline(pipeline)
+    scorers = {name: get_scorer(s) for name, s in (scoring or {}).items()}
+    folds = fold_transforms(preprocessing, X, y, cv, n_jobs=n_jobs)
+
+    if on_fold is not None:
+        scores = []
+        for i, (X_train, y_train, X_test, y_test) in enumerate(folds):
+            scores.append(_fit_and_score(clone(rest), X_train, y_train, X_test, y_test, scorers))
+            on_fold(i, _collect(scores, scorers))
+        return _collect(scores, scorers)
+
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score)(clone(rest), X_train, y_train, X_test, y_test, scorers)
+        for X_train, y_train, X_test, y_test in folds
+    )
+    return _collect(scores, scorers)
+
+
+def cached_fit(pipeline, X, y):
+    """
+    Fit `pipeline` in place, taking its fitted first step from the cache.
+    The result is an ordinary fitted pipeline that can be pickled and
+    served as before.
+    """
+    preprocessing, rest = split_pipeline(pipeline)
+    fitted, Xt = fitted_preprocessing(preprocessing, X, y)
+    # rest shares its step objects with pipeline, so this fits them in place
+    rest.fit(Xt, y)
+    pipeline.steps[0] = (pipeline.steps[0][0], fitted)
+    return pipeline
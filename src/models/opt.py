@@ -1,17 +1,70 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
 import numpy as np
+import optuna
+from optuna.pruners import HyperbandPruner, MedianPruner, NopPruner
+from optuna.samplers import TPESampler
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState
 from sklearn.linear_model import RidgeClassifier, LogisticRegression
 from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
 
 from sklearn.decomposition import PCA
 from sklearn.base import clone
-from sklearn.model_selection import cross_validate
 from sklearn.pipeline import make_pipeline
 
+from src.data.build_database import PROJECT_ROOT
+from src.models.budget import ThreadBudget
+from src.models.cache import cached_cross_validate
+from src.models.scheduler import limit_threads
+from src.utils.pipelines import MAX_BOOSTING_ROUNDS, EarlyStoppingClassifier
+
 SCORERS = {"f1": "f1_macro", "acc": "balanced_accuracy"}
+TUNING_FOLDS = 3
+
+STUDY_PATH = PROJECT_ROOT / "models" / "optuna_studies.log"
+PRUNERS = ("median", "hyperband", "none")
+FINISHED = (TrialState.COMPLETE, TrialState.PRUNED)
+# Bump when an objective's parameter names change, so stored studies with
+# the old names aren't resumed
+SEARCH_SPACE_VERSION = 2
+
+def objective_scorer(pipeline, X_train, y_train, budget=None, trial=None):
+    """
+    3-fold CV scores of `pipeline`, with folds split across the budget's
+    cores as ThreadBudget decides. With a `trial`, the running mean F1 is
+    reported after every fold (steps 1 to 3). When the folds run one after
+    another (boosters under cv_jobs="auto") the trial is pruned as soon as
+    the study's pruner says so; when they run in parallel the values are
+    only reported, for the pruner's statistics. A trial that scored every
+    fold is never pruned.
+    """
+    budget = budget or ThreadBudget()
+    with budget.cv(pipeline, TUNING_FOLDS) as n_jobs:
+        if trial is None:
+            return cached_cross_validate(
+                pipeline, X_train, y_train, cv=TUNING_FOLDS, scoring=SCORERS, n_jobs=n_jobs
+            )
+
+        if n_jobs > 1:
+            scores = cached_cross_validate(
+                pipeline, X_train, y_train, cv=TUNING_FOLDS, scoring=SCORERS, n_jobs=n_jobs
+            )
+            for fold in range(TUNING_FOLDS):
+                trial.report(scores["test_f1"][:fold + 1].mean(), fold + 1)
+            return scores
+
+        def report(fold, scores):
+            trial.report(scores["test_f1"].mean(), fold + 1)
+            if fold + 1 < TUNING_FOLDS and trial.should_prune():
+                raise optuna.TrialPruned()
 
-def objective_scorer(pipeline, X_train, y_train):
-    return cross_validate(pipeline, X_train, y_train, cv=3, scoring=SCORERS, n_jobs=-1, return_train_score=False)
+        return cached_cross_validate(
+            pipeline, X_train, y_train, cv=TUNING_FOLDS, scoring=SCORERS, n_jobs=1, on_fold=report
+        )
 
 def optional_use_pca(preprocessing, estimator, use_pca, pca_components):
     steps = [clone(preprocessing)]
@@ -20,7 +73,7 @@ def optional_use_pca(preprocessing, estimator, use_pca, pca_components):
     steps.append(estimator)
     return make_pipeline(*steps)
 
-def objective_logistic(trial, preprocessing, X_train, y_train, use_pca):
+def objective_logistic(trial, preprocessing, X_train, y_train, use_pca, budget=None):
     C = trial.suggest_float("logisticregression__C", 1e-3, 100.0, log=True)
     if use_pca:
         pca_components = trial.suggest_float("pca__n_components", 0.90, 0.99)
@@ -35,11 +88,11 @@ def objective_logistic(trial, preprocessing, X_train, y_train, use_pca):
 
     pipeline = optional_use_pca(preprocessing, estimator, use_pca, pca_components)
 
-    cv_results = objective_scorer(pipeline, X_train, y_train)
+    cv_results = objective_scorer(pipeline, X_train, y_train, budget, trial)
 
     return cv_results["test_f1"].mean()
 
-def objective_ridge(trial, preprocessing, X_train, y_train, use_pca):
+def objective_ridge(trial, preprocessing, X_train, y_train, use_pca, budget=None):
     alpha = trial.suggest_float("ridgeclassifier__alpha", 1e-3, 100.0, log=True)
     if use_pca:
         pca_components = trial.suggest_float("pca__n_components", 0.90, 0.99)
@@ -53,65 +106,64 @@ def objective_ridge(trial, preprocessing, X_train, y_train, use_pca):
     
     pipeline = optional_use_pca(preprocessing, estimator, use_pca, pca_components)
 
-    cv_results = objective_scorer(pipeline, X_train, y_train)
+    cv_results = objective_scorer(pipeline, X_train, y_train, budget, trial)
 
     return cv_results["test_f1"].mean()
 
-def objective_xgboost(trial, preprocessing, X_train, y_train, use_pca):
-    learning_rate = trial.suggest_float("xgbclassifier__learning_rate", 0.05, 0.3)
-    max_depth = trial.suggest_int("xgbclassifier__max_depth", 3, 8)
-    n_estimators = trial.suggest_int("xgbclassifier__n_estimators", 100, 300, step=50)
+def objective_xgboost(trial, preprocessing, X_train, y_train, use_pca, budget=None):
+    learning_rate = trial.suggest_float("earlystoppingclassifier__estimator__learning_rate", 0.05, 0.3)
+    max_depth = trial.suggest_int("earlystoppingclassifier__estimator__max_depth", 3, 8)
     if use_pca:
-        pca_components = trial.suggest_float("xgbclassifier__n_components", 0.90, 0.99)
+        pca_components = trial.suggest_float("pca__n_components", 0.90, 0.99)
     else:
         pca_components = None
 
-    estimator = XGBClassifier(
+    # Rounds come from early stopping, not from the search
+    estimator = EarlyStoppingClassifier(XGBClassifier(
             objective="multi:softprob",
             num_class=len(np.unique(y_train)),
             learning_rate=learning_rate,
             max_depth=max_depth,
-            n_estimators=n_estimators,
+            n_estimators=MAX_BOOSTING_ROUNDS,
             subsample=0.8,
             colsample_bytree=0.8,
             tree_method="hist",
             n_jobs=-1,
             random_state=42,
             eval_metric="mlogloss"
-        )
+        ))
     
     pipeline = optional_use_pca(preprocessing, estimator, use_pca, pca_components)
 
-    cv_results = objective_scorer(pipeline, X_train, y_train)
+    cv_results = objective_scorer(pipeline, X_train, y_train, budget, trial)
 
     return cv_results["test_f1"].mean()
 
-def objective_lightgbm(trial, preprocessing, X_train, y_train, use_pca):
-    learning_rate = trial.suggest_float("lgbmclassifier__learning_rate", 0.05, 0.3)
-    num_leaves = trial.suggest_int("lgbmclassifier__num_leaves", 20, 80)
-    n_estimators = trial.suggest_int("lgbmclassifier__n_estimators", 100, 300, step=50)
+def objective_lightgbm(trial, preprocessing, X_train, y_train, use_pca, budget=None):
+    learning_rate = trial.suggest_float("earlystoppingclassifier__estimator__learning_rate", 0.05, 0.3)
+    num_leaves = trial.suggest_int("earlystoppingclassifier__estimator__num_leaves", 20, 80)
     if use_pca:
         pca_components = trial.suggest_float("pca__n_components", 0.90, 0.99)
     else:
         pca_components = None
 
-    estimator = LGBMClassifier(
+    estimator = EarlyStoppingClassifier(LGBMClassifier(
             objective="multiclass",
             num_class=len(np.unique(y_train)),
             learning_rate=learning_rate,
             num_leaves=num_leaves,
-            n_estimators=n_estimators,
+            n_estimators=MAX_BOOSTING_ROUNDS,
             subsample=0.8,
             colsample_bytree=0.8,
             n_jobs=-1,
             random_state=42,
             verbose=-1,
             force_col_wise=True,
-        )
+        ))
     
     pipeline = optional_use_pca(preprocessing, estimator, use_pca, pca_components)
 
-    cv_results = objective_scorer(pipeline, X_train, y_train)
+    cv_results = objective_scorer(pipeline, X_train, y_train, budget, trial)
 
     return cv_results["test_f1"].mean()
 
@@ -120,4 +172,102 @@ OBJ_FUNCTIONS = {
     "ridge": objective_ridge,
     "xgboost": objective_xgboost,
     "lightgbm": objective_lightgbm
-}
\ No newline at end of file
+}
+
+def study_storage(path=STUDY_PATH):
+    """Journal file storage: safe for several processes on one machine."""
+    from optuna.storages import JournalStorage
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:  # optuna < 4
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return JournalStorage(JournalFileBackend(str(path)))
+
+def make_pruner(name="median"):
+    """
+    Pruners see one step per CV fold, numbered 1 to TUNING_FOLDS, so a
+    trial can be pruned after its first fold.
+    """
+    if name == "median":
+        return MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    if name == "hyperband":
+        return HyperbandPruner(min_resource=1, max_resource=TUNING_FOLDS)
+    if name == "none":
+        return NopPruner()
+    raise ValueError(f"Unknown pruner {name!r}, expected one of {PRUNERS}")
+
+def _finished_trials(study):
+    return len(study.get_trials(deepcopy=False, states=FINISHED))
+
+def _optimize(name, study_name, storage_path, pruner, seed, n_trials,
+              preprocessing, X_train, y_train, use_pca, budget, show_progress_bar=False):
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=study_storage(storage_path),
+        sampler=TPESampler(seed=seed),
+        pruner=make_pruner(pruner),
+    )
+    if _finished_trials(study) >= n_trials:
+        return
+    study.optimize(
+        lambda trial: OBJ_FUNCTIONS[name](trial, preprocessing, X_train, y_train, use_pca, budget),
+        callbacks=[MaxTrialsCallback(n_trials, states=FINISHED)],
+        show_progress_bar=show_progress_bar,
+    )
+
+def tune(name, preprocessing, X_train, y_train, use_pca, budget=None, n_trials=10,
+         n_jobs=1, pruner="median", storage_path=STUDY_PATH, show_progress_bar=False):
+    """
+    Tune `name` until its study holds `n_trials` finished (complete or
+    pruned) trials and return the best parameters.
+
+    Studies live in a journal file and are named after the model, PCA and
+    a hash of the training data, so an interrupted or repeated run resumes
+    where it left off instead of starting over. With `n_jobs` > 1 that
+    many processes optimize the same study, splitting `budget` between
+    them and sampling with different seeds.
+    """
+    budget = budget or ThreadBudget()
+    study_name = (
+        f"{name}{'_pca' if use_pca else ''}_study_"
+        f"{joblib.hash((SEARCH_SPACE_VERSION, X_train, y_train))[:8]}"
+    )
+    study = optuna.create_study(
+        direction="maximize",
+        study_name=study_name,
+        storage=study_storage(storage_path),
+        load_if_exists=True,
+    )
+    done = _finished_trials(study)
+    if done:
+        print(f"🔁 Resuming {study_name}: {done} of {n_trials} trials already finished")
+
+    n_jobs = max(1, min(n_jobs, budget.cores))
+    args = (name, study_name, storage_path, pruner)
+    data = (preprocessing, X_train, y_train, use_pca)
+    if n_jobs == 1:
+        _optimize(*args, 42, n_trials, *data, budget, show_progress_bar)
+    else:
+        share = ThreadBudget(max(1, budget.cores // n_jobs), budget.cv_jobs)
+        # Not forked: the parent may already have run LightGBM/XGBoost, and
+        # GNU OpenMP can hang in a child forked after it was initialized
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=limit_threads,
+            initargs=(share.cores,),
+        ) as pool:
+            futures = [
+                pool.submit(_optimize, *args, 42 + i, n_trials, *data, share)
+                for i in range(n_jobs)
+            ]
+            for future in futures:
+                future.result()
+
+    study = optuna.load_study(study_name=study_name, storage=study_storage(storage_path))
+    pruned = len(study.get_trials(deepcopy=False, states=(TrialState.PRUNED,)))
+    print(f"🎯 {study_name}: best F1 {study.best_value:.4f} "
+          f"({_finished_trials(study)} trials, {pruned} pruned)")
+    return study.best_params
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from src.models.budget import ThreadBudget, cpu_budget
+
+
+def limit_threads(threads):
+    # Caps BLAS/OpenMP pools that libraries size from the core count, so
+    # `workers` processes never run more than the budget between them
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(threads)
+
+
+def run_tasks(fn, tasks, workers=1, cpus=None, cv_jobs="auto"):
+    """
+    Call fn(*task, budget=ThreadBudget) for every task and return the
+    results in task order, whatever order they finish in.
+
+    With workers > 1 the tasks run in a pool of that many processes and
+    each gets an equal share of the `cpus` budget (default: all cores);
+    with one worker they run here, in sequence, with the whole budget.
+    """
+    cores = cpu_budget(cpus)
+    if workers <= 1:
+        budget = ThreadBudget(cores, cv_jobs)
+        return [fn(*task, budget=budget) for task in tasks]
+
+    workers = min(workers, len(tasks))
+    budget = ThreadBudget(max(1, cores // workers), cv_jobs)
+    print(f"🧵 Running {len(tasks)} tasks on {workers} workers, {budget.cores} cores each")
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=limit_threads,
+        initargs=(budget.cores,),
+    ) as pool:
+        futures = [pool.submit(fn, *task, budget=budget) for task in tasks]
+        return [future.result() for future in futures]
@@ -1,21 +1,21 @@
-import numpy as np
-import pandas as pd
+import multiprocessing
 import optuna
-from pathlib import Path
 
 from sklearn.decomposition import PCA
-from sklearn.model_selection import train_test_split, cross_validate
+from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
 from sklearn.base import clone
 
 import mlflow
 from mlflow.models import infer_signature
-from optuna.samplers import TPESampler
 
 from src.data.build_database import PROJECT_ROOT
 from src.utils.pipelines import build_preprocessing, make_estimator_for_name
 from src.utils.mlflow import set_mlflow, log_mlflow_helper, MLFLOW_TRACKING_URI
-from src.models.opt import OBJ_FUNCTIONS
+from src.models.budget import cpu_budget
+from src.models.cache import fitted_preprocessing, fold_transforms
+from src.models.opt import TUNING_FOLDS, tune as tune_study
+from src.models.scheduler import run_tasks
 from src.models.utils import train_eval
 
 OUTPUT = 'severity'
@@ -26,93 +26,107 @@ MODELS_ROOT = PROJECT_ROOT / "models"
 
 optuna.logging.set_verbosity(optuna.logging.WARNING)
 
-def train(df, pca=False, tune=False):
-    if mlflow.active_run() is not None:
-        mlflow.end_run()
-
-    preprocessing = build_preprocessing(50)
-    set_mlflow(MLFLOW_TRACKING_URI, 'accident_prediction_model')
+def run_suffix(pca, tune):
+    run = '_pca' if pca else '_baseline'
+    if tune:
+        run += '_optuna'
+    return run
 
+def split_data(df):
     X = df.drop(columns=[OUTPUT])
     y = df[OUTPUT].astype(int) - 1
 
-    split = train_test_split(
+    return train_test_split(
         X, y,
         test_size=0.2,
         stratify=y,
         random_state=42,
     )
 
+def warm_preprocessing_cache(split, runs, cpus=None):
+    """
+    Fit the shared preprocessing for every split the tasks will ask for
+    (the 5 train_eval folds, the tuning folds, the full training set), so
+    parallel workers load it from the cache instead of all computing the
+    same transforms at once.
+    """
+    X_train, y_train = split[0], split[2]
+    preprocessing = build_preprocessing(50)
+    n_jobs = cpu_budget(cpus)
+
+    fold_transforms(preprocessing, X_train, y_train, 5, n_jobs=n_jobs)
+    if any(tune for _, tune in runs):
+        fold_transforms(preprocessing, X_train, y_train, TUNING_FOLDS, n_jobs=n_jobs)
+    fitted_preprocessing(preprocessing, X_train, y_train)
+
+def train_model(name, split, pca=False, tune=False, tuning=None, budget=None):
+    """
+    Build, optionally tune, evaluate and log one model family for one run
+    configuration within `budget`, the cores of this task (default: all).
+    `tuning` holds keyword arguments for src.models.opt.tune (n_trials,
+    n_jobs, pruner).
+    Runs in a worker process under the scheduler, so it sets up MLflow
+    itself and logs exactly one run.
+    """
+    if mlflow.active_run() is not None:
+        mlflow.end_run()
+
+    preprocessing = build_preprocessing(50)
+    set_mlflow(MLFLOW_TRACKING_URI, 'accident_prediction_model')
+
     X_train = split[0]
-    X_test = split[1]
     y_train = split[2]
-    y_test = split[3]
-
-    models = {}
-    for name in MODELS:
-        print(f'🏋️‍♂️ Training Model: {name} with pca={pca} and tune={tune}')
-        if pca:
-            est = make_estimator_for_name(name, 4)
-            models[name] = make_pipeline(clone(preprocessing), PCA(n_components=0.95), est)
-
-            if tune:
-                study = optuna.create_study(
-                    direction="maximize",
-                    sampler=TPESampler(seed=42),
-                    study_name=f"{name}_pca_study"
-                )
-
-                study.optimize(
-                    lambda trial: OBJ_FUNCTIONS[name](trial, preprocessing, X_train, y_train, True),
-                    n_trials=10,
-                    show_progress_bar=True
-                )
-                best_params = study.best_params
-
-                models[name].set_params(**best_params)
-        else:
-            est = make_estimator_for_name(name, 4)
-            models[name] = make_pipeline(clone(preprocessing), est)
-
-            if tune:
-                study = optuna.create_study(
-                    direction="maximize",
-                    sampler=TPESampler(seed=42),
-                    study_name=f"{name}_study"
-                )
-
-                study.optimize(
-                    lambda trial: OBJ_FUNCTIONS[name](trial, preprocessing, X_train, y_train, False),
-                    n_trials=10,
-                    show_progress_bar=True
-                )
-                best_params = study.best_params
-
-                models[name].set_params(**best_params)
-
-    results = {}
+
+    print(f'🏋️‍♂️ Training Model: {name} with pca={pca} and tune={tune}')
+    est = make_estimator_for_name(name, 4)
     if pca:
-        run = f'_pca_optuna'
-        if tune:
-            run = f'_pca_optuna'
+        pipeline = make_pipeline(clone(preprocessing), PCA(n_components=0.95), est)
     else:
-        run = f'_baseline'
-        if tune:
-            run = f'_baseline_optuna'
-
-    for name, pipeline in models.items():
-        run_name = name+run
-        if mlflow.active_run() is not None:
-            mlflow.end_run()
-
-        results[name] = train_eval(pipeline, *split)
-        if pca:
-            with mlflow.start_run(run_name=run_name, nested=True):
-                signature = infer_signature(X_train, pipeline.predict(X_train))
-                log_mlflow_helper(name, results[name], True, signature, X_train)
-        else:
-            with mlflow.start_run(run_name=run_name, nested=True):
-                signature = infer_signature(X_train, pipeline.predict(X_train))
-                log_mlflow_helper(name, results[name], False, signature, X_train)
-
-    return results
\ No newline at end of file
+        pipeline = make_pipeline(clone(preprocessing), est)
+
+    if tune:
+        best_params = tune_study(
+            name, preprocessing, X_train, y_train, pca,
+            budget=budget,
+            show_progress_bar=multiprocessing.parent_process() is None,
+            **(tuning or {})
+        )
+
+        pipeline.set_params(**best_params)
+
+    run_name = name + run_suffix(pca, tune)
+    result = train_eval(pipeline, *split, budget=budget)
+    with mlflow.start_run(run_name=run_name, nested=True):
+        signature = infer_signature(X_train, pipeline.predict(X_train))
+        log_mlflow_helper(name, result, pca, signature, X_train)
+
+    return result
+
+def train_runs(df, runs, workers=1, cpus=None, cv_jobs="auto", tuning=None):
+    """
+    Train every model family for every (pca, tune) run configuration.
+
+    With `workers` > 1 the (configuration, family) pairs run concurrently
+    in that many processes sharing a budget of `cpus` cores (default: all);
+    `cv_jobs` says how each task splits its share (see ThreadBudget).
+    Results are keyed by MLflow run name (e.g. "lightgbm_pca_optuna") and
+    come back in the same order however the tasks are scheduled.
+    """
+    split = split_data(df)
+    if workers > 1:
+        warm_preprocessing_cache(split, runs, cpus)
+
+    tasks = [(name, split, pca, tune, tuning) for pca, tune in runs for name in MODELS]
+    results = run_tasks(train_model, tasks, workers=workers, cpus=cpus, cv_jobs=cv_jobs)
+
+    return {
+        name + run_suffix(pca, tune): result
+        for (name, _, pca, tune, _), result in zip(tasks, results)
+    }
+
+def train(df, pca=False, tune=False, workers=1, cpus=None, cv_jobs="auto", tuning=None):
+    """Train every model family for one run configuration, keyed by family."""
+    results = train_runs(df, [(pca, tune)], workers=workers, cpus=cpus, cv_jobs=cv_jobs,
+                         tuning=tuning)
+    suffix = run_suffix(pca, tune)
+    return {key[:-len(suffix)]: result for key, result in results.items()}
@@ -1,17 +1,26 @@
-from sklearn.model_selection import cross_validate
 from sklearn.metrics import f1_score, balanced_accuracy_score
 
+from src.models.budget import ThreadBudget
+from src.models.cache import cached_cross_validate, cached_fit
+from src.utils.pipelines import set_refit
+
 SCORERS = {"f1": "f1_macro", "acc": "balanced_accuracy"}
 
-def train_eval(pipeline, X_train, X_test, y_train, y_test, pca=False):
-    cv_scores = cross_validate(
-        pipeline, X_train, y_train,
-        cv=5, scoring=SCORERS, n_jobs=-1
-    )
+def train_eval(pipeline, X_train, X_test, y_train, y_test, pca=False, budget=None):
+    budget = budget or ThreadBudget()
+    set_refit(pipeline, False)
+    with budget.cv(pipeline, 5) as n_jobs:
+        cv_scores = cached_cross_validate(
+            pipeline, X_train, y_train,
+            cv=5, scoring=SCORERS, n_jobs=n_jobs
+        )
     cv_f1 = cv_scores['test_f1'].mean()
     cv_acc = cv_scores['test_acc'].mean()
 
-    pipeline.fit(X_train, y_train)
+    # Early-stopped boosters refit on all of X_train for their best round count
+    set_refit(pipeline, True)
+    with budget.fit(pipeline):
+        cached_fit(pipeline, X_train, y_train)
 
     y_pred = pipeline.predict(X_test)
 
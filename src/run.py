@@ -3,9 +3,11 @@ import time
 import warnings
 import logging
 
+from src.data.backend import BACKENDS
 from src.data.build_database import PROJECT_ROOT
 from src.data.load_database import load_database
-from src.models.train import train
+from src.models.opt import PRUNERS
+from src.models.train import train_runs
 from src.utils.helper import save_model
 
 warnings.filterwarnings(
@@ -42,11 +44,58 @@ if __name__ == "__main__":
         action="store_true",
         help="Run all combinations of PCA and tuning"
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Storage backend for loading features (default: $DB_BACKEND or sqlite)"
+    )
+    parser.add_argument(
+        "--compact-dtypes",
+        action="store_true",
+        help="Downcast the training frame (float32, int8 flags, categoricals) to save memory"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Train model families and run configurations in this many processes"
+    )
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=None,
+        help="Cores shared by all workers (default: every core available)"
+    )
+    parser.add_argument(
+        "--cv-jobs",
+        default="auto",
+        help="CV processes per task; each fit gets the task's cores divided by this. "
+             "'auto' gives boosters every core and other models one core per fold"
+    )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        default=10,
+        help="Finished Optuna trials per study; studies resume from models/optuna_studies.log"
+    )
+    parser.add_argument(
+        "--tune-jobs",
+        type=int,
+        default=1,
+        help="Processes optimizing each study in parallel"
+    )
+    parser.add_argument(
+        "--pruner",
+        choices=PRUNERS,
+        default="median",
+        help="Prune weak trials after each CV fold where folds run sequentially, i.e. boosters (default: median)"
+    )
     args = parser.parse_args()
 
     start_time = time.monotonic()
 
-    df = load_database()
+    df = load_database(backend=args.backend, compact=args.compact_dtypes)
     runs = []
     if args.tune:
         runs.append((False, True))
@@ -62,19 +111,24 @@ if __name__ == "__main__":
     else:
         runs.append((False, False))
 
-    all_results = {}
-    for pca_flag, tune_flag in runs:
-        print(
-            f"\n{'='*80}\n"
-            f"🏃 Starting up training...\n"
-            f"{'='*80}"
-        )
-        
-        all_results.update(train(
-            df,
-            pca=pca_flag,
-            tune=tune_flag
-        ))
+    print(
+        f"\n{'='*80}\n"
+        f"🏃 Starting up training...\n"
+        f"{'='*80}"
+    )
+
+    all_results = train_runs(
+        df,
+        runs,
+        workers=args.workers,
+        cpus=args.cpus,
+        cv_jobs=args.cv_jobs,
+        tuning={
+            "n_trials": args.trials,
+            "n_jobs": args.tune_jobs,
+            "pruner": args.pruner,
+        }
+    )
 
     global_best_name = max(all_results, key=lambda k: all_results[k]["test_f1"])
     global_best_f1 = all_results[global_best_name]["test_f1"]
@@ -0,0 +1,220 @@
+import argparse
+import os
+import sqlite3
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.data.build_database import PROJECT_ROOT, SQL_PATH, ensure_features
+from src.data.load_database import feature_query
+from src.models.budget import set_n_jobs
+from src.utils.helper import load_model, predict_with_proba
+
+warnings.filterwarnings(
+    "ignore",
+    message="X does not have valid feature names"
+)
+
+MODEL_PATH = PROJECT_ROOT / "models" / "global_best_model_optuna.pkl"
+OUTPUT = "severity"
+
+_model = None
+
+
+def read_chunks(source, chunksize):
+    """
+    Yield feature frames of at most `chunksize` rows from the SQLite
+    database, a CSV file, or a Parquet file.
+    """
+    suffix = source.suffix.lower()
+
+    if suffix in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(source)
+        try:
+            ensure_features(conn)
+            yield from pd.read_sql(feature_query(with_id=True), conn, chunksize=chunksize)
+        finally:
+            conn.close()
+    elif suffix == ".csv":
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported source format: {source}")
+
+
+class ChunkWriter:
+    """Append scored chunks to a Parquet file or a SQLite table."""
+
+    def __init__(self, output, table="predictions"):
+        self.output = output
+        self.table = table
+        self.suffix = output.suffix.lower()
+        self._writer = None
+        self._conn = None
+
+        if self.suffix in (".db", ".sqlite", ".sqlite3"):
+            self._conn = sqlite3.connect(output)
+            self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        elif self.suffix != ".parquet":
+            raise ValueError(f"Unsupported output format: {output}")
+
+    def write(self, df):
+        if self._conn is not None:
+            df.to_sql(self.table, self._conn, if_exists="append", index=False)
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.output, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+
+
+def _init_worker(model_path, threads):
+    global _model
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=threads)
+    _model = load_model(model_path)
+    # LightGBM/XGBoost size their predict threads from n_jobs, not from
+    # the OpenMP limit above
+    if hasattr(_model, "steps"):
+        set_n_jobs(_model, threads)
+
+
+def score_chunk(df, id_column="accident_id"):
+    """Score one frame with the worker's model and return the output columns."""
+    if hasattr(_model, "feature_names_in_"):
+        X = df[list(_model.feature_names_in_)]
+    else:
+        X = df.drop(columns=[id_column, OUTPUT], errors="ignore")
+
+    labels, probs = predict_with_proba(_model, X)
+
+    out = pd.DataFrame(index=df.index)
+    if id_column in df.columns:
+        out[id_column] = df[id_column].to_numpy()
+    out["predicted_severity"] = labels + 1
+    if probs is not None:
+        for j, c in enumerate(_model.classes_):
+            out[f"prob_severity_{int(c) + 1}"] = probs[:, j]
+    return out.reset_index(drop=True)
+
+
+def score(source, output, model_path=MODEL_PATH, chunksize=100_000,
+          workers=None, table="predictions", id_column="accident_id"):
+    """
+    Score `source` chunk by chunk across worker processes and write the
+    results to `output` in input order.
+
+    At most two chunks per worker are in flight, so memory is bounded by
+    the chunk size rather than the size of the input.
+    """
+    if output.resolve() == source.resolve():
+        # The reader holds a shared lock on the source for the whole run
+        raise ValueError("Output must be a different file than the source")
+
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    writer = ChunkWriter(output, table=table)
+
+    rows = 0
+    start = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_path, threads),
+    ) as pool:
+        pending = deque()
+        try:
+            for chunk in read_chunks(source, chunksize):
+                pending.append(pool.submit(score_chunk, chunk, id_column))
+                if len(pending) >= 2 * workers:
+                    result = pending.popleft().result()
+                    writer.write(result)
+                    rows += len(result)
+                    print(f"  {rows:,} rows scored ({rows / (time.monotonic() - start):,.0f} rows/s)")
+            while pending:
+                result = pending.popleft().result()
+                writer.write(result)
+                rows += len(result)
+        finally:
+            writer.close()
+
+    elapsed = time.monotonic() - start
+    print(f"✓ Scored {rows:,} rows in {elapsed:.2f}s → {output}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Batch-score accidents from SQLite, CSV or Parquet"
+    )
+    parser.add_argument(
+        "--source",
+        type=Path,
+        default=SQL_PATH,
+        help="Input .db (feature query), .csv or .parquet (default: data/accidents.db)"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Output .parquet file or .db SQLite database"
+    )
+    parser.add_argument(
+        "--table",
+        default="predictions",
+        help="Table name when writing to SQLite"
+    )
+    parser.add_argument(
+        "--model",
+        type=Path,
+        default=MODEL_PATH,
+        help="Serialized pipeline to score with"
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=100_000,
+        help="Rows per chunk"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: all CPUs)"
+    )
+    parser.add_argument(
+        "--id-column",
+        default="accident_id",
+        help="Column carried through to the output to identify rows"
+    )
+    args = parser.parse_args()
+
+    score(
+        args.source,
+        args.output,
+        model_path=args.model,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        table=args.table,
+        id_column=args.id_column,
+    )
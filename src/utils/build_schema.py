@@ -1,12 +1,14 @@
+import argparse
 import json
-import sqlite3
-import pandas as pd
 from pathlib import Path
 
-from src.data.load_database import load_database
+from src.data.backend import BACKENDS, connect
 
 DB_PATH = Path(__file__).resolve().parents[2] / "data" / "accidents.db"
-SCHEMA_PATH = Path(__file__).resolve().parents[2] / "data" / "data_schema.json"
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "data" / "accident_schema.json"
+
+# Every schema statistic is an aggregate over this table (see load_database)
+FEATURE_TABLE = "accident_features"
 
 NUMERICAL_COLS = [
     "hour", "month", "latitude", "longitude",
@@ -26,49 +28,75 @@ BINARY_COLS = [
 ]
 
 
-def build_numerical_schema(df):
+def build_numerical_schema(conn, table=FEATURE_TABLE):
+    """
+    min/max/mean for every numerical column in a single aggregate scan,
+    then an exact median per column read from the database's external sort
+    (the middle one or two non-null values), so nothing is held in memory.
+    `conn` is anything with a DB-API style `execute`, e.g. a storage
+    backend from src.data.backend.
+    """
+    aggregates = ", ".join(
+        f"min({col}), max({col}), avg({col}), count({col})" for col in NUMERICAL_COLS
+    )
+    row = conn.execute(f"SELECT {aggregates} FROM {table}").fetchone()
+
     schema = {}
-    for col in NUMERICAL_COLS:
-        series = df[col].dropna()
+    for i, col in enumerate(NUMERICAL_COLS):
+        lo, hi, mean, n = row[4 * i:4 * i + 4]
+        if n == 0:
+            raise ValueError(f"{table}.{col} has no values")
+        middle = conn.execute(
+            f"SELECT {col} FROM {table} WHERE {col} IS NOT NULL "
+            f"ORDER BY {col} LIMIT {2 - n % 2} OFFSET {(n - 1) // 2}"
+        ).fetchall()
         schema[col] = {
-            "min": float(series.min()),
-            "max": float(series.max()),
-            "mean": float(series.mean()),
-            "median": float(series.median()),
+            "min": float(lo),
+            "max": float(hi),
+            "mean": float(mean),
+            "median": sum(v for (v,) in middle) / len(middle),
         }
     return schema
 
 
-def build_categorical_schema(df):
+def _value_counts(conn, table, col):
+    return conn.execute(
+        f"SELECT {col}, count(*) FROM {table} WHERE {col} IS NOT NULL "
+        f"GROUP BY {col} ORDER BY count(*) DESC, {col}"
+    ).fetchall()
+
+
+def build_categorical_schema(conn, table=FEATURE_TABLE):
     schema = {}
     for col in CATEGORICAL_COLS:
-        counts = df[col].value_counts(dropna=True)
+        counts = _value_counts(conn, table, col)
         schema[col] = {
-            "unique_values": counts.index.tolist(),
-            "value_counts": counts.to_dict(),
+            "unique_values": [value for value, _ in counts],
+            "value_counts": dict(counts),
         }
     return schema
 
 
-def build_binary_schema(df):
+def build_binary_schema(conn, table=FEATURE_TABLE):
     schema = {}
     for col in BINARY_COLS:
-        counts = df[col].value_counts(dropna=True)
+        counts = _value_counts(conn, table, col)
         schema[col] = {
-            "unique_values": sorted(counts.index.tolist()),
-            "value_counts": {str(k): int(v) for k, v in counts.items()},
+            "unique_values": sorted(value for value, _ in counts),
+            "value_counts": {str(value): int(n) for value, n in counts},
         }
     return schema
 
-def main():
-    print("📥 Loading data from SQLite...")
-    df = load_database()
+def main(backend=None):
+    conn = connect(backend, DB_PATH)
+    print(f"📥 Aggregating {FEATURE_TABLE} with {conn.name}...")
 
     schema = {
-        "numerical": build_numerical_schema(df),
-        "categorical": build_categorical_schema(df),
-        "binary": build_binary_schema(df),
+        "numerical": build_numerical_schema(conn),
+        "categorical": build_categorical_schema(conn),
+        "binary": build_binary_schema(conn),
     }
+    conn.close()
 
     print(f"💾 Writing schema to {SCHEMA_PATH}")
     with open(SCHEMA_PATH, "w") as f:
@@ -78,4 +106,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Build data/accident_schema.json from the feature table"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Storage backend to aggregate with (default: $DB_BACKEND or sqlite)"
+    )
+    args = parser.parse_args()
+
+    main(backend=args.backend)
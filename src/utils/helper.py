@@ -1,5 +1,43 @@
 import joblib
+import numpy as np
 
 def save_model(model, filename="global_best_model.pkl"):
     joblib.dump(model, filename)
-    print(f"✓ Model saved to {filename}")
\ No newline at end of file
+    print(f"✓ Model saved to {filename}")
+
+def load_model(path):
+    """Load the trained model from disk."""
+    if not path.exists():
+        raise FileNotFoundError(f"Model file not found: {path}")
+
+    print(f"Loading model from: {path}")
+    m = joblib.load(path)
+    print("✓ Model loaded successfully!")
+    print(f"  Model type: {type(m).__name__}")
+    if hasattr(m, "named_steps"):
+        print(f"  Pipeline steps: {list(m.named_steps.keys())}")
+    return m
+
+def predict_with_proba(model, X):
+    """
+    Run the model once and return (labels, probabilities).
+
+    Labels are taken from the argmax of the probability matrix, which is what
+    `predict` does for every classifier we train, so the preprocessing and the
+    estimator only see the batch a single time. Models without `predict_proba`
+    (e.g. RidgeClassifier) fall back to one `decision_function` call and
+    return `None` for the probabilities.
+    """
+    classes = model.classes_
+
+    if hasattr(model, "predict_proba"):
+        probs = model.predict_proba(X)
+        return classes.take(np.argmax(probs, axis=1)), probs
+
+    if hasattr(model, "decision_function"):
+        scores = model.decision_function(X)
+        if scores.ndim == 1:
+            return classes.take((scores > 0).astype(int)), None
+        return classes.take(np.argmax(scores, axis=1)), None
+
+    return model.predict(X), None
@@ -31,7 +31,12 @@ def log_mlflow_helper(name, name_dict, pca, signature, X_train):
 
     est_step_name = list(pipeline.named_steps.keys())[-1]
     est = pipeline.named_steps[est_step_name]
-    est_params = {f"{est_step_name}__{k}": v for k, v in est.get_params().items()}
+    params = est.get_params()
+    if hasattr(est, "n_estimators_"):
+        # Early-stopped booster: log the rounds it kept rather than the ceiling
+        params.pop("estimator")
+        params["estimator__n_estimators"] = est.n_estimators_
+    est_params = {f"{est_step_name}__{k}": v for k, v in params.items()}
     mlflow.log_params(est_params)
 
     for key, val in name_dict.items():
@@ -1,14 +1,14 @@
-from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin, clone
 from sklearn.cluster import KMeans
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.linear_model import LogisticRegression, RidgeClassifier
-from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
+
+# Estimator libraries are imported inside make_estimator_for_name: unpickling a
+# model imports this module for ClusterSimilarity, and the API shouldn't pay
+# for xgboost when it serves a LightGBM pipeline (or vice versa).
 
 class ClusterSimilarity(BaseEstimator, TransformerMixin):
     def __init__(self, n_clusters=10, gamma=1.0, random_state=None):
@@ -35,6 +35,81 @@ class ClusterSimilarity(BaseEstimator, TransformerMixin):
     def get_feature_names_out(self, names=None):
         return [f"Cluster {i} similarity" for i in range(self.n_clusters)]
 
+# Upper bound on boosting rounds; EarlyStoppingClassifier picks the actual number
+MAX_BOOSTING_ROUNDS = 1000
+
+def _library(estimator):
+    return type(estimator).__module__.partition(".")[0]
+
+class EarlyStoppingClassifier(ClassifierMixin, BaseEstimator):
+    """
+    Fits an XGBoost or LightGBM classifier with early stopping on a
+    stratified validation split and predicts with its best iteration. With
+    `refit` it then fits again on all the data for the best number of
+    rounds found, which doubles the boosting work: CV and tuning leave it
+    off, and only the final fit turns it on (see `set_refit`). The wrapped
+    estimator's n_estimators is only an upper bound; `n_estimators_` holds
+    the rounds the fitted model actually uses.
+    """
+
+    def __init__(self, estimator=None, validation_fraction=0.1,
+                 early_stopping_rounds=20, refit=False, random_state=42):
+        self.estimator = estimator
+        self.validation_fraction = validation_fraction
+        self.early_stopping_rounds = early_stopping_rounds
+        self.refit = refit
+        self.random_state = random_state
+
+    def _fit_early_stopping(self, estimator, X, y, X_val, y_val):
+        """Fit with early stopping and return the best number of rounds."""
+        library = _library(estimator)
+        if library == "xgboost":
+            estimator.set_params(early_stopping_rounds=self.early_stopping_rounds)
+            estimator.fit(X, y, eval_set=[(X_val, y_val)], verbose=False)
+            return estimator.best_iteration + 1
+        if library == "lightgbm":
+            from lightgbm import early_stopping
+            estimator.fit(
+                X, y,
+                eval_set=[(X_val, y_val)],
+                callbacks=[early_stopping(self.early_stopping_rounds, verbose=False)],
+            )
+            return estimator.best_iteration_ or estimator.n_estimators
+        raise TypeError(f"Early stopping is only supported for XGBoost and LightGBM, got {type(estimator).__name__}")
+
+    def fit(self, X, y):
+        from sklearn.model_selection import train_test_split
+
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X, y,
+            test_size=self.validation_fraction,
+            stratify=y,
+            random_state=self.random_state,
+        )
+        probe = clone(self.estimator)
+        self.n_estimators_ = self._fit_early_stopping(probe, X_fit, y_fit, X_val, y_val)
+
+        if self.refit:
+            self.estimator_ = clone(self.estimator).set_params(n_estimators=self.n_estimators_)
+            self.estimator_.fit(X, y)
+        else:
+            self.estimator_ = probe
+        self.classes_ = self.estimator_.classes_
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.estimator_.predict_proba(X)
+
+def set_refit(pipeline, refit):
+    """Turn the full-data refit of every EarlyStoppingClassifier step on or off."""
+    for _, step in pipeline.steps:
+        if isinstance(step, EarlyStoppingClassifier):
+            step.set_params(refit=refit)
+    return pipeline
+
 cat_pipeline = make_pipeline(
     SimpleImputer(strategy="most_frequent"),
     OneHotEncoder(handle_unknown="ignore"),
@@ -61,29 +136,34 @@ def make_estimator_for_name(name: str, n_classes: int):
     PCA is handled in the preprocessing pipeline, NOT here.
     """
     if name == "logistic":
+        from sklearn.linear_model import LogisticRegression
         return LogisticRegression(
             solver="lbfgs",
             max_iter=1000,
             random_state=42
         )
     elif name == "ridge":
+        from sklearn.linear_model import RidgeClassifier
         return RidgeClassifier(
             random_state=42
         )
     elif name == "gradient_boosting":
+        from sklearn.ensemble import GradientBoostingClassifier
         return GradientBoostingClassifier(
             random_state=42
         )
     elif name == "histgradientboosting":
+        from sklearn.ensemble import HistGradientBoostingClassifier
         return HistGradientBoostingClassifier(
             random_state=42
         )
     elif name == "xgboost":
-        return XGBClassifier(
+        from xgboost import XGBClassifier
+        return EarlyStoppingClassifier(XGBClassifier(
             objective="multi:softprob",
             num_class=n_classes,
             eval_metric="mlogloss",
-            n_estimators=300,
+            n_estimators=MAX_BOOSTING_ROUNDS,
             learning_rate=0.1,
             max_depth=6,
             subsample=0.8,
@@ -91,12 +171,13 @@ def make_estimator_for_name(name: str, n_classes: int):
             tree_method="hist",
             n_jobs=-1,
             random_state=42
-        )
+        ))
     elif name == "lightgbm":
-        return LGBMClassifier(
+        from lightgbm import LGBMClassifier
+        return EarlyStoppingClassifier(LGBMClassifier(
             objective="multiclass",
             num_class=n_classes,
-            n_estimators=300,
+            n_estimators=MAX_BOOSTING_ROUNDS,
             learning_rate=0.05,
             num_leaves=31,
             subsample=0.8,
@@ -105,6 +186,6 @@ def make_estimator_for_name(name: str, n_classes: int):
             verbose=-1,
             force_col_wise=True,
             random_state=42
-        )
+        ))
     else:
         raise ValueError(f"Unknown model name: {name}")
\ No newline at end of file
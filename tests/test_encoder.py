@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.api.encoder import CompiledEncoder, check_parity, parity_records
+from src.utils.pipelines import build_preprocessing
+
+STATES = ["CA", "TX", "FL", "NY"]
+WEATHER = ["Clear", "Rain", "Fog"]
+
+
+@pytest.fixture(scope="module")
+def preprocessing():
+    rng = np.random.default_rng(0)
+    n = 80
+    df = pd.DataFrame({
+        "hour": rng.integers(0, 24, size=n),
+        "day": rng.integers(1, 29, size=n),
+        "latitude": rng.uniform(25, 48, size=n),
+        "longitude": rng.uniform(-124, -70, size=n),
+        "temperature_f": rng.normal(60, 15, size=n),
+        "state": rng.choice(STATES, size=n).astype(object),
+        "weather_condition": rng.choice(WEATHER, size=n).astype(object),
+    })
+    df.loc[::7, "temperature_f"] = np.nan
+    df.loc[::9, "weather_condition"] = np.nan
+    return build_preprocessing(3).fit(df)
+
+
+# Comparison tolerances per encoder dtype; float32 is what the API serves
+TOLERANCES = {
+    np.float32: {"rtol": 1e-5, "atol": 1e-5},
+    np.float64: {"rtol": 1e-9, "atol": 1e-12},
+}
+
+
+@pytest.fixture(scope="module", params=[np.float32, np.float64], ids=["float32", "float64"])
+def encoder(request, preprocessing):
+    return CompiledEncoder(preprocessing, dtype=request.param)
+
+
+def tolerance(encoder):
+    return TOLERANCES[encoder.dtype.type]
+
+
+def record(**overrides):
+    base = {
+        "hour": 8, "day": 14, "latitude": 34.05, "longitude": -118.24,
+        "temperature_f": 65.0, "state": "CA", "weather_condition": "Clear",
+    }
+    base.update(overrides)
+    return base
+
+
+def sklearn_transform(preprocessing, records, columns):
+    out = preprocessing.transform(pd.DataFrame(records, columns=columns))
+    return out.toarray() if hasattr(out, "toarray") else out
+
+
+def test_parity_on_synthetic_records(preprocessing, encoder):
+    records = parity_records(encoder, n=200)
+    check_parity(encoder, preprocessing, records, **tolerance(encoder))
+
+
+def test_nan_and_unseen_categories_match_sklearn(preprocessing, encoder):
+    records = [
+        record(),
+        record(temperature_f=float("nan")),
+        record(weather_condition=float("nan")),
+        record(state="ZZ"),
+        record(state="ZZ", weather_condition="Volcanic ash"),
+    ]
+    expected = sklearn_transform(preprocessing, records, encoder.feature_names_in)
+    got = encoder.transform(records).copy()
+    np.testing.assert_allclose(got, expected, **tolerance(encoder))
+
+    # Unseen categories encode as all zeros in the one-hot block
+    start = 0
+    for name, branch in encoder.branches:
+        if name == "cat":
+            break
+        start += branch.width
+    one_hot = got[:, start:start + branch.width]
+    assert one_hot[0].sum() == 2
+    assert one_hot[3].sum() == 1
+    assert one_hot[4].sum() == 0
+
+
+def test_missing_key_raises_like_the_pandas_path(preprocessing, encoder):
+    without_day = record()
+    del without_day["day"]
+
+    with pytest.raises(ValueError):
+        preprocessing.transform(pd.DataFrame([without_day]))
+    with pytest.raises(ValueError):
+        encoder.transform([without_day])
+
+
+def test_key_missing_from_some_records_is_imputed(preprocessing, encoder):
+    without_day = record()
+    del without_day["day"]
+    records = [record(), without_day]
+
+    # Both paths see a day column with a NaN in the second row
+    expected = sklearn_transform(preprocessing, records, encoder.feature_names_in)
+    got = encoder.transform(records).copy()
+    np.testing.assert_allclose(got, expected, **tolerance(encoder))